@@ -4,11 +4,12 @@ from typing import Optional, Tuple, TYPE_CHECKING
 
 from actor_groups import ActorGroups
 import color
+from entity import Item
 import exceptions
 
 if TYPE_CHECKING:
     from engine import Engine
-    from entity import Actor, Entity, Item
+    from entity import Actor, Entity
 
 
 class Action:
@@ -44,12 +45,13 @@ class PickupAction(Action):
         actor_location_y = self.entity.y
         inventory = self.entity.inventory
 
-        for item in self.engine.game_map.items:
-            if actor_location_x == item.x and actor_location_y == item.y:
+        for item in self.engine.game_map.get_entities_at_location(
+                actor_location_x, actor_location_y):
+            if isinstance(item, Item):
                 if len(inventory.items) >= inventory.capacity:
                     raise exceptions.Impossible("Your inventory is full.")
 
-                self.engine.game_map.entities.remove(item)
+                self.engine.game_map.remove_entity(item)
                 item.parent = self.entity.inventory
                 inventory.items.append(item)
 
@@ -107,11 +109,18 @@ class WaitAction(Action):
 class TakeStairsAction(Action):
     def perform(self) -> None:
         """Take the stairs, if any exist at the entity's location."""
-        if (self.entity.x, self.entity.y) == self.engine.game_map.downstairs_location:
-            self.engine.game_world.generate_floor()
+        location = (self.entity.x, self.entity.y)
+        game_world = self.engine.game_world
+        if location == self.engine.game_map.downstairs_location:
+            game_world.generate_floor()
             self.engine.message_log.add_message(
                     "You descend the staircase.", color.descend
             )
+        elif location == self.engine.game_map.upstairs_location:
+            game_world.enter_floor(game_world.current_floor - 1)
+            self.engine.message_log.add_message(
+                    "You ascend the staircase.", color.descend
+            )
         else:
             raise exceptions.Impossible("There are no stairs here.")
 
@@ -183,7 +192,7 @@ class MovementAction(ActionWithDirection):
         if not self.engine.game_map.in_bounds(dest_x, dest_y):
             # Destination is out of bounds
             raise exceptions.Impossible("That way is blocked.")
-        if not self.engine.game_map.tiles["walkable"][dest_x, dest_y]:
+        if not self.engine.game_map.walkable[dest_x, dest_y]:
             # Destination is blocked by a tile
             raise exceptions.Impossible("That way is blocked.")
         if self.engine.game_map.get_blocking_entity_at_location(
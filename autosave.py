@@ -0,0 +1,101 @@
+"""Periodic saving of the game in the background."""
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import time
+from typing import Callable, Optional, TYPE_CHECKING
+
+from profiling import profiler
+import savefile
+
+if TYPE_CHECKING:
+    from engine import Engine
+
+
+class AutosaveStats:
+    """Costs of a single autosave."""
+
+    def __init__(self, turn: int, snapshot_seconds: float):
+        self.turn = turn
+        # Time the game thread was blocked taking the snapshot.
+        self.snapshot_seconds = snapshot_seconds
+        # Time spent serializing, compressing and writing on the worker.
+        self.write_seconds = 0.0
+        # Time from the snapshot being taken until the file was in place.
+        self.latency_seconds = 0.0
+        self.size = 0  # In bytes.
+
+
+class Autosaver:
+    """Save the game every `interval` turns without stalling the game.
+
+    Only a snapshot of the game state is taken on the game thread, it is
+    written to `filename` on a worker thread. If the previous autosave is
+    still being written when the next one is due, the next is skipped.
+    Turns are counted from when the saver first sees an engine, so a loaded
+    or new game isn't saved at once. `on_saved` is called from the worker
+    thread after every autosave.
+    """
+
+    def __init__(
+            self,
+            filename: str,
+            interval: int = 50,
+            compression: str = "zlib",
+            on_saved: Optional[Callable[[AutosaveStats], None]] = None,
+    ):
+        self.filename = filename
+        self.interval = interval
+        self.compression = compression
+        self.on_saved = on_saved
+        # The engine being saved and the turn it was last saved on.
+        self.engine: Optional[Engine] = None
+        self.last_saved_turn = 0
+        self.pending: Optional[Future[AutosaveStats]] = None
+        self.executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="autosave")
+
+    def maybe_save(self, engine: Engine) -> bool:
+        """Start an autosave if one is due. Returns True if one started."""
+        if engine is not self.engine:
+            self.engine = engine
+            self.last_saved_turn = engine.turn
+        if engine.turn - self.last_saved_turn < self.interval:
+            return False
+        if not engine.player.is_alive:
+            return False  # Finished games are not saved.
+        if self.pending and not self.pending.done():
+            return False
+        self.save(engine)
+        return True
+
+    def save(self, engine: Engine) -> None:
+        """Snapshot the game now and write it in the background."""
+        start = time.perf_counter()
+        state, layers, packed = savefile.snapshot_engine(engine)
+        stats = AutosaveStats(engine.turn, time.perf_counter() - start)
+        profiler.record("autosave.snapshot", stats.snapshot_seconds)
+        self.engine = engine
+        self.last_saved_turn = engine.turn
+
+        def write() -> AutosaveStats:
+            write_start = time.perf_counter()
+            stats.size = savefile.write_save(
+                    self.filename, state, layers, self.compression, packed)
+            end = time.perf_counter()
+            stats.write_seconds = end - write_start
+            stats.latency_seconds = end - start
+            profiler.record("autosave.write", stats.write_seconds)
+            if self.on_saved:
+                self.on_saved(stats)
+            return stats
+
+        self.pending = self.executor.submit(write)
+
+    def wait(self) -> None:
+        """Block until any autosave in progress has been written."""
+        if self.pending:
+            self.pending.result()
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
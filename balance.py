@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""Monte-Carlo melee simulator for balancing entity_factories matchups.
+
+Each combatant is written as a prototype name from entity_factories followed
+by the parts it has equipped, joined by "+". Runs without a window.
+
+Example::
+
+    python balance.py --side player+capacitor --against troll
+    python balance.py --side player --side allied_dummy --against orc \\
+        --against orc --trials 1000000 --workers 8
+    python balance.py --side player --against troll --sweep-parts
+"""
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np  # type: ignore
+
+import combat
+import entity_factories
+from entity import Actor, Item
+from exceptions import Impossible
+
+# Fights still going after this many rounds are counted as draws.
+MAX_ROUNDS = 1000
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class Stats(NamedTuple):
+    """The stats of one combatant, all a fight needs to know."""
+    name: str
+    hp: int
+    avoidance: int
+    defense: int
+    dice_count: int
+    dice_sides: int
+    power: int
+
+
+def part_names() -> List[str]:
+    """Return the names of the part prototypes in entity_factories."""
+    return sorted(
+        name for name, value in vars(entity_factories).items()
+        if isinstance(value, Item) and value.equippable is not None
+    )
+
+
+def build_actor(spec: str) -> Actor:
+    """Return a copy of a prototype with the parts in `spec` equipped."""
+    name, *parts = spec.split("+")
+    prototype = getattr(entity_factories, name, None)
+    if not isinstance(prototype, Actor):
+        raise ValueError(f"{name!r} is not an actor in entity_factories.")
+    actor = prototype.clone()
+    for part_name in parts:
+        part = getattr(entity_factories, part_name, None)
+        if not isinstance(part, Item) or part.equippable is None:
+            raise ValueError(
+                    f"{part_name!r} is not a part in entity_factories.")
+        item = part.clone()
+        item.parent = actor.inventory
+        actor.inventory.items.append(item)
+        actor.equipment.equip(item, add_message=False)
+    actor.fighter._hp = actor.fighter.max_hp
+    return actor
+
+
+def get_stats(spec: str) -> Stats:
+    fighter = build_actor(spec).fighter
+    return Stats(
+        spec, fighter.max_hp, fighter.avoidance, fighter.defense,
+        fighter.dice_count, fighter.dice_sides, fighter.power,
+    )
+
+
+def attack(
+        attackers: Sequence[Stats],
+        attacker_hp: np.ndarray,
+        defenders: Sequence[Stats],
+        defender_hp: np.ndarray,
+        fighting: np.ndarray,
+        rng: np.random.Generator,
+) -> None:
+    """Have every living attacker hit a random living defender, in each
+    trial still `fighting`. Updates `defender_hp` in place."""
+    avoidance = np.array([stats.avoidance for stats in defenders])
+    defense = np.array([stats.defense for stats in defenders])
+    for i, stats in enumerate(attackers):
+        trials = np.flatnonzero(fighting & (attacker_hp[:, i] > 0))
+        alive = defender_hp[trials] > 0
+        trials = trials[alive.any(axis=1)]
+        if not len(trials):
+            continue
+        # A random living defender: dead ones score 0 and are never the
+        # largest.
+        alive = defender_hp[trials] > 0
+        scores = (rng.random(alive.shape) + 1.0) * alive
+        targets = scores.argmax(axis=1)
+
+        damage = rng.integers(
+                1, stats.dice_sides + 1, (len(trials), stats.dice_count)
+        ).sum(axis=1) + stats.power
+        taken = combat.roll_damage(
+                avoidance[targets], defense[targets], damage, rng)
+        defender_hp[trials, targets] = np.maximum(
+                0, defender_hp[trials, targets] - np.maximum(taken, 0))
+
+
+def simulate(
+        side_a: Sequence[Stats],
+        side_b: Sequence[Stats],
+        trials: int,
+        seed: np.random.SeedSequence,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Fight `trials` independent battles between two sides.
+
+    Side A attacks first each round. Returns for each trial the winner (0
+    for side A, 1 for side B, -1 for a draw), the rounds fought and the
+    fraction of the winner's total hp remaining.
+    """
+    rng = np.random.default_rng(seed)
+    hp_a = np.tile(np.array([stats.hp for stats in side_a]), (trials, 1))
+    hp_b = np.tile(np.array([stats.hp for stats in side_b]), (trials, 1))
+    rounds = np.zeros(trials, dtype=np.int32)
+    fighting = np.ones(trials, dtype=bool)
+
+    for _ in range(MAX_ROUNDS):
+        rounds += fighting
+        attack(side_a, hp_a, side_b, hp_b, fighting, rng)
+        attack(side_b, hp_b, side_a, hp_a, fighting, rng)
+        fighting &= (hp_a > 0).any(axis=1) & (hp_b > 0).any(axis=1)
+        if not fighting.any():
+            break
+
+    winner = np.full(trials, -1, dtype=np.int8)
+    winner[~fighting & (hp_a > 0).any(axis=1)] = 0
+    winner[~fighting & (hp_b > 0).any(axis=1)] = 1
+    remaining = np.where(
+            winner == 0,
+            hp_a.sum(axis=1) / sum(stats.hp for stats in side_a),
+            hp_b.sum(axis=1) / sum(stats.hp for stats in side_b),
+    )
+    remaining[winner == -1] = 0.0
+    return winner, rounds, remaining
+
+
+def run(
+        side_a: Sequence[Stats],
+        side_b: Sequence[Stats],
+        trials: int,
+        seed: int,
+        executor: Optional[ProcessPoolExecutor],
+        chunk_size: int,
+) -> Dict[str, Any]:
+    """Run `trials` battles, in chunks with independent random streams,
+    and summarize them."""
+    chunks = [chunk_size] * (trials // chunk_size)
+    if trials % chunk_size:
+        chunks.append(trials % chunk_size)
+    # The streams depend only on the seed and chunk size, so results don't
+    # change with the number of workers.
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+
+    if executor is None:
+        results = [
+            simulate(side_a, side_b, count, chunk_seed)
+            for count, chunk_seed in zip(chunks, seeds)
+        ]
+    else:
+        results = list(executor.map(
+            simulate, itertools.repeat(side_a), itertools.repeat(side_b),
+            chunks, seeds,
+        ))
+    winner = np.concatenate([result[0] for result in results])
+    rounds = np.concatenate([result[1] for result in results])
+    remaining = np.concatenate([result[2] for result in results])
+
+    summary: Dict[str, Any] = {
+        "side": [stats._asdict() for stats in side_a],
+        "against": [stats._asdict() for stats in side_b],
+        "trials": trials,
+        "win_rate": float((winner == 0).mean()),
+        "loss_rate": float((winner == 1).mean()),
+        "draw_rate": float((winner == -1).mean()),
+    }
+    for name, side in (("win", 0), ("loss", 1)):
+        won = winner == side
+        summary[f"{name}_rounds"] = percentiles(rounds[won])
+        summary[f"{name}_hp_remaining"] = percentiles(remaining[won])
+    return summary
+
+
+def percentiles(values: np.ndarray) -> Dict[str, float]:
+    if not len(values):
+        return {}
+    return {
+        f"p{p}": float(value)
+        for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES))
+    }
+
+
+def format_percentiles(values: Dict[str, float], scale: float = 1.0,
+                       suffix: str = "") -> str:
+    if not values:
+        return "-"
+    return " / ".join(f"{value * scale:.0f}{suffix}"
+                      for value in values.values())
+
+
+def print_summary(summary: Dict[str, Any], seconds: float) -> None:
+    side = ", ".join(stats["name"] for stats in summary["side"])
+    against = ", ".join(stats["name"] for stats in summary["against"])
+    print(f"{side} vs {against}: {summary['trials']} trials "
+          f"in {seconds:.2f}s")
+    print(f"  win {summary['win_rate']:.1%}, loss {summary['loss_rate']:.1%}"
+          f", draw {summary['draw_rate']:.1%}")
+    heading = "/".join(f"p{p}" for p in PERCENTILES)
+    for name in ("win", "loss"):
+        print(f"  {name} rounds ({heading}): "
+              + format_percentiles(summary[f"{name}_rounds"]))
+        print(f"  {name} hp left ({heading}): "
+              + format_percentiles(
+                      summary[f"{name}_hp_remaining"], 100, "%"))
+
+
+def loadouts(spec: str) -> List[str]:
+    """Return `spec` with every combination of parts which fits."""
+    actor = build_actor(spec)
+    free = actor.equipment.max_parts - len(actor.equipment.parts)
+    return [
+        "+".join([spec, *parts])
+        for count in range(free + 1)
+        for parts in itertools.combinations(part_names(), count)
+    ]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+            "--side", action="append", metavar="SPEC",
+            help="A combatant on the simulated side, e.g. player+servos. "
+                 "May be repeated. Defaults to the player.")
+    parser.add_argument(
+            "--against", action="append", metavar="SPEC",
+            help="A combatant on the opposing side. May be repeated. "
+                 "Defaults to an orc.")
+    parser.add_argument(
+            "--sweep-parts", action="store_true",
+            help="Try every combination of parts on the first combatant.")
+    parser.add_argument("--trials", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 1,
+            help="Worker processes, 1 to run in this process.")
+    parser.add_argument(
+            "--chunk-size", type=int, default=20000,
+            help="Trials per task, each with its own random stream.")
+    parser.add_argument(
+            "--json", metavar="FILE", help="Also write the results as JSON.")
+    args = parser.parse_args(argv)
+
+    side_specs = args.side or ["player"]
+    matchups = [side_specs]
+    try:
+        against = [get_stats(spec) for spec in args.against or ["orc"]]
+        if args.sweep_parts:
+            matchups = [
+                [first, *side_specs[1:]] for first in loadouts(side_specs[0])
+            ]
+        sides = [[get_stats(spec) for spec in specs] for specs in matchups]
+    except (ValueError, Impossible) as exc:
+        parser.error(str(exc))
+
+    executor = None
+    if args.workers > 1:
+        executor = ProcessPoolExecutor(
+                max_workers=args.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+        )
+    results = []
+    try:
+        for side in sides:
+            start = time.perf_counter()
+            summary = run(
+                    side, against,
+                    args.trials, args.seed, executor,
+                    args.chunk_size,
+            )
+            seconds = time.perf_counter() - start
+            summary["seconds"] = seconds
+            print_summary(summary, seconds)
+            results.append(summary)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if args.sweep_parts:
+        print("Loadouts by win rate:")
+        for summary in sorted(results, key=lambda s: -s["win_rate"]):
+            print(f"  {summary['win_rate']:6.1%}  {summary['side'][0]['name']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
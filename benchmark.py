@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""Benchmarks for the game engine, run without a window.
+
+Example::
+
+    python benchmark.py turns --turns 2000 --seeds 5
+    python benchmark.py save
+    python benchmark.py procgen --width 200 --height 200 --rooms 400
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import lzma
+import os
+import pickle
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from engine import Engine
+import entity_factories
+import headless
+import procgen
+from profiling import profiler
+import savefile
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Return the peak resident memory of this process in MiB, if known."""
+    try:
+        import resource
+    except ImportError:  # Not available on Windows.
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak / 2 ** 20  # Reported in bytes.
+    return peak / 2 ** 10  # Reported in KiB.
+
+
+def bench_turns(args: argparse.Namespace) -> Dict[str, Any]:
+    """Play headless sessions and report throughput for each phase."""
+    policy = headless.POLICIES[args.policy]
+    sessions: List[Dict[str, Any]] = []
+    profiler.enabled = bool(args.profile)
+
+    for seed in range(args.first_seed, args.first_seed + args.seeds):
+        if args.trace_memory:
+            tracemalloc.start()
+        stats = headless.run_session(
+                seed, args.turns, policy, render=not args.no_render
+        )
+        session: Dict[str, Any] = {
+            "seed": seed,
+            "turns": stats.turns,
+            "floor": stats.floor,
+            "player_alive": stats.player_alive,
+            "seconds": stats.elapsed,
+            "turns_per_second": stats.turns_per_second,
+            "phase_ms_per_turn": {
+                phase: 1000 * seconds / max(1, stats.turns)
+                for phase, seconds in stats.phase_times.items()
+            },
+        }
+        if args.trace_memory:
+            peak_traced = tracemalloc.get_traced_memory()[1]
+            session["peak_traced_mb"] = peak_traced / 2 ** 20
+            tracemalloc.stop()
+        sessions.append(session)
+
+        print(
+            f"seed {seed}: {stats.turns} turns, floor {stats.floor}, "
+            f"{stats.turns_per_second:.0f} turns/sec"
+            + ("" if stats.player_alive else " (player died)")
+        )
+
+    total_turns = sum(session["turns"] for session in sessions)
+    total_seconds = sum(session["seconds"] for session in sessions)
+    phase_totals = {
+        phase: sum(
+            session["phase_ms_per_turn"][phase] * session["turns"]
+            for session in sessions
+        ) / max(1, total_turns)
+        for phase in headless.PHASES
+    }
+
+    print(f"total: {total_turns} turns, "
+          f"{total_turns / total_seconds:.0f} turns/sec")
+    for phase, ms in phase_totals.items():
+        print(f"  {phase:<14} {ms:8.3f} ms/turn")
+    rss = peak_rss_mb()
+    if rss is not None:
+        print(f"  peak memory    {rss:8.1f} MiB")
+    if args.profile:
+        profiler.export_json(args.profile)
+
+    return {
+        "benchmark": "turns",
+        "policy": args.policy,
+        "turns": total_turns,
+        "turns_per_second": total_turns / total_seconds,
+        "phase_ms_per_turn": phase_totals,
+        "peak_rss_mb": rss,
+        "sessions": sessions,
+    }
+
+
+def best_time(func: Callable[[], Any], repeat: int) -> float:
+    """Return the fastest of `repeat` calls to `func`, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_save(args: argparse.Namespace) -> Dict[str, Any]:
+    """Compare the save format against pickle and lzma."""
+    results: Dict[str, Dict[str, List[float]]] = {}
+    directory = tempfile.mkdtemp()
+    filename = os.path.join(directory, "bench.sav")
+
+    def pickle_save(engine: Any) -> None:
+        with open(filename, "wb") as f:
+            f.write(lzma.compress(pickle.dumps(engine)))
+
+    def pickle_load() -> None:
+        with open(filename, "rb") as f:
+            pickle.loads(lzma.decompress(f.read()))
+
+    formats: Dict[str, Any] = {
+        "pickle+lzma": (pickle_save, pickle_load),
+    }
+    for compression in savefile.COMPRESSIONS:
+        formats[compression] = (
+            lambda engine, compression=compression: savefile.save_engine(
+                engine, filename, compression),
+            lambda: savefile.load_engine(filename),
+        )
+
+    for seed in range(args.first_seed, args.first_seed + args.seeds):
+        engine = headless.run_session(seed, args.turns, render=False).engine
+        for name, (save, load) in formats.items():
+            result = results.setdefault(
+                    name, {"save_ms": [], "load_ms": [], "bytes": []})
+            result["save_ms"].append(
+                    1000 * best_time(lambda: save(engine), args.repeat))
+            result["bytes"].append(os.path.getsize(filename))
+            result["load_ms"].append(1000 * best_time(load, args.repeat))
+    os.remove(filename)
+    os.rmdir(directory)
+
+    print(f"{'format':<12} {'save ms':>9} {'load ms':>9} {'bytes':>9}")
+    summary = {}
+    for name, result in results.items():
+        summary[name] = {
+            key: sum(values) / len(values) for key, values in result.items()
+        }
+        print(f"{name:<12} {summary[name]['save_ms']:9.2f} "
+              f"{summary[name]['load_ms']:9.2f} {summary[name]['bytes']:9.0f}")
+    return {"benchmark": "save", "formats": summary}
+
+
+def bench_procgen(args: argparse.Namespace) -> Dict[str, Any]:
+    """Time each stage of generating floors, and building their GameMaps,
+    for each floor generator."""
+    if args.generator == "all":
+        names = list(procgen.GENERATORS)
+    else:
+        names = [args.generator]
+    print(f"{args.width}x{args.height}, floor {args.floor}, "
+          f"{args.seeds} seeds")
+    results = {}
+    for name in names:
+        generator = procgen.GENERATORS[name]
+        plan_times, map_times = [], []
+        stages: Dict[str, List[float]] = {}
+        for seed in range(args.first_seed, args.first_seed + args.seeds):
+            start = time.perf_counter()
+            plan = generator(
+                    max_rooms=args.rooms, room_min_size=args.room_min_size,
+                    room_max_size=args.room_max_size, map_width=args.width,
+                    map_height=args.height, floor=args.floor, seed=seed,
+            )
+            plan_times.append(1000 * (time.perf_counter() - start))
+            for stage, seconds in plan.timings.items():
+                stages.setdefault(stage, []).append(1000 * seconds)
+
+            engine = Engine(player=entity_factories.player.clone(), seed=seed)
+            start = time.perf_counter()
+            procgen.build_game_map(plan, engine)
+            map_times.append(1000 * (time.perf_counter() - start))
+
+        result: Dict[str, Any] = {
+            "plan_ms": sum(plan_times) / len(plan_times),
+            "game_map_ms": sum(map_times) / len(map_times),
+            "stage_ms": {
+                stage: sum(values) / len(values)
+                for stage, values in stages.items()
+            },
+        }
+        results[name] = result
+        print(f"{name:<8} plan {result['plan_ms']:8.2f} ms, "
+              f"game map {result['game_map_ms']:8.2f} ms")
+        for stage, ms in result["stage_ms"].items():
+            print(f"  {stage:<14} {ms:8.3f} ms")
+    return {
+        "benchmark": "procgen",
+        "width": args.width,
+        "height": args.height,
+        "generators": results,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+            "--json", metavar="FILE", help="Also write the results as JSON.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    turns = subparsers.add_parser(
+            "turns", help="Turns per second of headless game sessions.")
+    turns.add_argument("--turns", type=int, default=1000,
+                       help="Turns to play per seed.")
+    turns.add_argument("--seeds", type=int, default=3,
+                       help="Number of seeds to play.")
+    turns.add_argument("--first-seed", type=int, default=0)
+    turns.add_argument("--policy", choices=sorted(headless.POLICIES),
+                       default="random", help="How the player is driven.")
+    turns.add_argument("--no-render", action="store_true",
+                       help="Skip rendering to an offscreen console.")
+    turns.add_argument("--trace-memory", action="store_true",
+                       help="Trace peak Python memory per seed (slower).")
+    turns.add_argument("--profile", metavar="FILE",
+                       help="Write the profiler timings as JSON.")
+    turns.set_defaults(func=bench_turns)
+
+    save = subparsers.add_parser(
+            "save", help="Save and load times against pickle and lzma.")
+    save.add_argument("--turns", type=int, default=300,
+                      help="Turns to play before saving each game.")
+    save.add_argument("--seeds", type=int, default=3,
+                      help="Number of games to save.")
+    save.add_argument("--first-seed", type=int, default=0)
+    save.add_argument("--repeat", type=int, default=5,
+                      help="Take the best time of this many runs.")
+    save.set_defaults(func=bench_save)
+
+    gen = subparsers.add_parser(
+            "procgen", help="Compare the floor generators stage by stage.")
+    gen.add_argument("--generator", default="all",
+                     choices=["all", *procgen.GENERATORS])
+    gen.add_argument("--width", type=int, default=60)
+    gen.add_argument("--height", type=int, default=40)
+    gen.add_argument("--rooms", type=int, default=30,
+                     help="Room placement attempts per floor.")
+    gen.add_argument("--room-min-size", type=int, default=6)
+    gen.add_argument("--room-max-size", type=int, default=10)
+    gen.add_argument("--floor", type=int, default=1)
+    gen.add_argument("--seeds", type=int, default=20,
+                     help="Number of floors to generate.")
+    gen.add_argument("--first-seed", type=int, default=0)
+    gen.set_defaults(func=bench_procgen)
+
+    args = parser.parse_args(argv)
+    results = args.func(args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Entity fields kept in NumPy columns, for queries over a whole map."""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+
+import numpy as np  # type: ignore
+
+from entity import Actor
+
+if TYPE_CHECKING:
+    from entity import Entity
+
+
+# Column names and types. `alive` marks living actors and `in_use` rows
+# which hold an entity.
+COLUMNS: Dict[str, Any] = {
+    "x": np.int32,
+    "y": np.int32,
+    "hp": np.int32,
+    "group": np.int8,
+    "blocks_movement": np.bool_,
+    "render_order": np.int8,
+    "char": np.int32,  # Code point.
+    "color": (np.uint8, 3),
+    "alive": np.bool_,
+    "in_use": np.bool_,
+}
+
+
+class ColumnStore:
+    """The position, hp, group, blocking, render order and glyph of every
+    entity on a map, one row per entity.
+
+    The entities remain the source of truth, the GameMap writes an
+    entity's row whenever one of these fields changes. Rows are handed out
+    in the order entities are added and are only reused by `compact`,
+    which keeps that order, so row order is always the maps entity order.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self.size = 0  # Rows handed out so far, including removed ones.
+        self.rows: Dict[Entity, int] = {}
+        self.entities: List[Optional[Entity]] = []
+        self.x: np.ndarray = self._new_column("x")
+        self.y: np.ndarray = self._new_column("y")
+        self.hp: np.ndarray = self._new_column("hp")
+        self.group: np.ndarray = self._new_column("group")
+        self.blocks_movement: np.ndarray = self._new_column("blocks_movement")
+        self.render_order: np.ndarray = self._new_column("render_order")
+        self.char: np.ndarray = self._new_column("char")
+        self.color: np.ndarray = self._new_column("color")
+        self.alive: np.ndarray = self._new_column("alive")
+        self.in_use: np.ndarray = self._new_column("in_use")
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _new_column(self, name: str) -> np.ndarray:
+        return np.zeros(self.capacity, dtype=COLUMNS[name])
+
+    def _grow(self) -> None:
+        self.capacity *= 2
+        for name in COLUMNS:
+            column = getattr(self, name)
+            grown = np.zeros(
+                    (self.capacity, *column.shape[1:]), dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def add(self, entity: Entity) -> None:
+        if self.size == self.capacity:
+            if len(self.rows) <= self.size // 2:
+                self.compact()
+            else:
+                self._grow()
+        row = self.size
+        self.size += 1
+        self.rows[entity] = row
+        self.entities.append(entity)
+        self.write(row, entity)
+
+    def remove(self, entity: Entity) -> None:
+        row = self.rows.pop(entity)
+        self.entities[row] = None
+        self.in_use[row] = self.alive[row] = False
+
+    def move(self, entity: Entity) -> None:
+        row = self.rows[entity]
+        self.x[row] = entity.x
+        self.y[row] = entity.y
+
+    def update(self, entity: Entity) -> None:
+        """Rewrite the row of an entity, if it is in this store."""
+        row = self.rows.get(entity)
+        if row is not None:
+            self.write(row, entity)
+
+    def update_hp(self, actors: List[Actor]) -> None:
+        rows = [self.rows[actor] for actor in actors]
+        self.hp[rows] = [actor.fighter.hp for actor in actors]
+
+    def write(self, row: int, entity: Entity) -> None:
+        self.x[row] = entity.x
+        self.y[row] = entity.y
+        self.blocks_movement[row] = entity.blocks_movement
+        self.render_order[row] = entity.render_order.value
+        self.char[row] = ord(entity.char)
+        self.color[row] = entity.color
+        self.in_use[row] = True
+        if isinstance(entity, Actor):
+            self.hp[row] = entity.fighter.hp
+            self.group[row] = entity.group.value
+            self.alive[row] = entity.is_alive
+        else:
+            self.hp[row] = self.group[row] = 0
+            self.alive[row] = False
+
+    def compact(self) -> None:
+        """Drop the rows of removed entities."""
+        entities = [entity for entity in self.entities if entity is not None]
+        self.size = 0
+        self.rows.clear()
+        self.entities.clear()
+        for entity in entities:
+            self.add(entity)
+
+    def get_entities(self, rows: np.ndarray) -> List[Entity]:
+        """Return the entities of an array of rows."""
+        entities = self.entities
+        return [entities[row] for row in rows.tolist()]  # type: ignore
+
+    def living_actor_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.alive[:self.size])
@@ -0,0 +1,94 @@
+"""Resolve many attacks at once with NumPy.
+
+Follows the same rules as `Fighter.take_damage`: an attack is first
+checked against the defender's avoidance, then every point of defense
+above the damage is a roll which may change the damage taken.
+"""
+from __future__ import annotations
+
+from typing import Callable, Optional, Sequence, Union, TYPE_CHECKING
+
+import numpy as np  # type: ignore
+
+from components.fighter import DEFENSE_ROLL_CHANCE
+
+if TYPE_CHECKING:
+    from engine import Engine
+    from entity import Actor
+
+# Damage taken by a defender who avoided the attack.
+AVOIDED = -1
+
+
+def batch_rng(engine: Engine) -> np.random.Generator:
+    """Return a NumPy generator for one batch, seeded from the engine's
+    random generator so that games stay reproducible."""
+    return np.random.default_rng(engine.rng.getrandbits(64))
+
+
+def roll_damage(
+        avoidance: np.ndarray,
+        defense: np.ndarray,
+        damage: np.ndarray,
+        rng: np.random.Generator,
+) -> np.ndarray:
+    """Return the damage taken for each row of attacks, or AVOIDED.
+
+    Defense rolls are drawn as one binomial per row instead of one random
+    number per point of defense.
+    """
+    avoid_chance = (avoidance / (avoidance + 10.0)) * 0.75
+    avoided = rng.random(len(damage)) <= avoid_chance
+
+    defense_rolls = np.maximum(0, defense - damage)
+    successes = rng.binomial(defense_rolls, DEFENSE_ROLL_CHANCE)
+    # As in calculate_reduction_from_defense, when there are rolls the
+    # reduction is the damage less the successful rolls.
+    reduction = np.where(defense_rolls > 0, damage - successes, 0)
+    taken = np.maximum(0, damage - reduction)
+    return np.where(avoided, AVOIDED, taken)
+
+
+def resolve_attacks(
+        engine: Engine,
+        defenders: Sequence[Actor],
+        damage: Union[int, np.ndarray],
+        on_hit: Optional[Callable[[Actor, int], None]] = None,
+) -> np.ndarray:
+    """Attack every defender for `damage` (one value, or one per defender)
+    and apply the damage taken.
+
+    Each defender must appear once and be on the current map. Returns the
+    damage taken by each defender, AVOIDED where the attack was avoided.
+    `on_hit` is called with each defender and its damage taken, in order,
+    before that defender dies, so the attack can be reported first.
+    Only defenders that are killed go through `Fighter.hp`, to die.
+    """
+    count = len(defenders)
+    fighters = [defender.fighter for defender in defenders]
+    avoidance = np.fromiter(
+            (fighter.avoidance for fighter in fighters), np.int64, count)
+    defense = np.fromiter(
+            (fighter.defense for fighter in fighters), np.int64, count)
+    hp = np.fromiter((fighter.hp for fighter in fighters), np.int64, count)
+    damage = np.broadcast_to(np.asarray(damage, dtype=np.int64), (count,))
+
+    taken = roll_damage(avoidance, defense, damage, batch_rng(engine))
+    new_hp = np.maximum(0, hp - np.maximum(taken, 0))
+
+    hurt = np.flatnonzero((new_hp != hp) & (new_hp > 0))
+    for i, value in zip(hurt.tolist(), new_hp[hurt].tolist()):
+        # Nobody here dies, so skip the setter and update the map once.
+        fighters[i]._hp = value
+    engine.game_map.hp_changed([defenders[i] for i in hurt.tolist()])
+
+    killed = set(np.flatnonzero((new_hp != hp) & (new_hp == 0)).tolist())
+    if on_hit is None:
+        for i in sorted(killed):
+            fighters[i].hp = 0
+        return taken
+    for i, value in enumerate(taken.tolist()):
+        on_hit(defenders[i], value)
+        if i in killed:
+            fighters[i].hp = 0
+    return taken
@@ -0,0 +1,88 @@
+"""Exact odds of a melee attack, worked out without rolling any dice.
+
+Follows `Fighter.attack` and `Fighter.take_damage`: the attack roll is
+`dice_count`d`dice_sides` + `power`, the defender then avoids the attack
+with `calculate_if_attack_avoided`'s chance, and otherwise takes damage as
+decided by the defense rolls of `calculate_reduction_from_defense`.
+"""
+from __future__ import annotations
+
+import functools
+from math import comb
+from typing import TYPE_CHECKING
+
+import numpy as np  # type: ignore
+
+from components.fighter import DEFENSE_ROLL_CHANCE
+
+if TYPE_CHECKING:
+    from components.fighter import Fighter
+
+
+class DamageOdds:
+    """The distribution of damage taken from one attack.
+
+    `damage[k]` is the chance the attack lands and deals exactly `k`
+    damage, so together with `avoid_chance` it sums to 1.
+    """
+
+    def __init__(self, avoid_chance: float, damage: np.ndarray):
+        self.avoid_chance = avoid_chance
+        self.damage = damage
+        self.damage.flags.writeable = False  # Shared through the cache.
+        self.expected_damage = float(
+                (np.arange(len(damage)) * damage).sum())
+
+    def kill_chance(self, hp: int) -> float:
+        """Return the chance that one attack deals at least `hp` damage."""
+        return float(self.damage[max(0, hp):].sum())
+
+
+def attack_roll(dice_count: int, dice_sides: int, power: int) -> np.ndarray:
+    """Return the chance of each attack roll, indexed by the roll."""
+    pmf = np.zeros(power + 1)
+    pmf[power] = 1.0
+    die = np.full(dice_sides + 1, 1.0 / dice_sides)
+    die[0] = 0.0
+    for _ in range(dice_count):
+        pmf = np.convolve(pmf, die)
+    return pmf
+
+
+def defense_rolls(rolls: int) -> np.ndarray:
+    """Return the chance of each number of successful defense rolls."""
+    k = np.arange(rolls + 1)
+    binomial = np.array([comb(rolls, i) for i in k], dtype=np.float64)
+    return (binomial * DEFENSE_ROLL_CHANCE ** k
+            * (1 - DEFENSE_ROLL_CHANCE) ** (rolls - k))
+
+
+@functools.lru_cache(maxsize=4096)
+def damage_odds(
+        dice_count: int, dice_sides: int, power: int,
+        avoidance: int, defense: int,
+) -> DamageOdds:
+    """Return the odds of an attack with these attacker and defender
+    stats."""
+    avoid_chance = min(1.0, (avoidance / (avoidance + 10.0)) * 0.75)
+
+    rolls = attack_roll(dice_count, dice_sides, power)
+    damage = np.zeros(max(len(rolls), defense + 1))
+    for roll in np.flatnonzero(rolls).tolist():
+        chance = rolls[roll]
+        if defense > roll:
+            # Damage taken is the number of successful defense rolls, as
+            # calculate_reduction_from_defense takes the rest off.
+            outcomes = defense_rolls(defense - roll)
+            damage[:len(outcomes)] += chance * outcomes
+        else:
+            damage[roll] += chance
+    return DamageOdds(avoid_chance, damage * (1.0 - avoid_chance))
+
+
+def fighter_odds(attacker: Fighter, defender: Fighter) -> DamageOdds:
+    """Return the odds of one attack by `attacker` on `defender`."""
+    return damage_odds(
+            attacker.dice_count, attacker.dice_sides, attacker.power,
+            defender.avoidance, defender.defense,
+    )
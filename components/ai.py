@@ -1,70 +1,133 @@
 from __future__ import annotations
 
-import random
+from collections import Counter
 from typing import List, Optional, Tuple, TYPE_CHECKING
 
 import numpy as np  # type: ignore
-import tcod
-from tcod.map import compute_fov
+import tcod.path
 
 from actions import Action, BumpAction, MeleeAction, MovementAction, WaitAction
 from actor_groups import ActorGroups, select_group_from_list
+from combat_odds import fighter_odds
 
 if TYPE_CHECKING:
     from entity import Actor
 
 
+# A stored path is kept while its end is within this many tiles (Chebyshev
+# distance) of the target, otherwise it is re-planned.
+PATH_REPLAN_TOLERANCE = 2
+
+# How often stored paths were "reused" or "replanned", across all AIs.
+path_stats: Counter[str] = Counter()
+
+
 class BaseAI(Action):
     entity: Actor
+    path: List[Tuple[int, int]]
 
     def perform(self) -> None:
         raise NotImplementedError()
 
+    def clone(self, entity: Actor) -> BaseAI:
+        """Return a copy of this AI controlling `entity`."""
+        clone = object.__new__(type(self))
+        clone.__dict__ = self.__dict__.copy()
+        clone.entity = entity
+        if hasattr(self, "path"):
+            clone.path = list(self.path)
+        return clone
+
     def get_path_to(self, dest_x: int, dest_y: int) -> List[Tuple[int, int]]:
         """Compute and return a path to the target position.
 
+        The path walks downhill on the distance map shared by every actor
+        heading for the same destination this turn.
         If there is no valid path an empty list is returned.
         """
-        # Copy the walkable array.
-        cost = np.array(self.entity.gamemap.tiles["walkable"], dtype=np.int8)
+        distance = self.entity.gamemap.get_distance_map(dest_x, dest_y)
 
-        for entity in self.entity.gamemap.entities:
-            # Check that an entity blocks movement and cost isn't 0 (blocking.)
-            if entity.blocks_movement and cost[entity.x, entity.y]:
-                # Add to the cost of a blocked position.
-                # A lower number means more enemies will crowd behind eachother
-                # A higher number means enemies will take longer paths in order
-                # to surround
-                cost[entity.x, entity.y] += 10
+        # Climb down from the start position and remove the starting point
+        path: List[List[int]] = tcod.path.hillclimb2d(
+                distance, (self.entity.x, self.entity.y), True, True
+        )[1:].tolist()
 
-        # Create a graph from the cost array and pass that graph to a
-        # new pathfinder
-        graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
-        pathfinder = tcod.path.Pathfinder(graph)
+        # Convert from List[List[int]] to List[Tuple[int, int]].
+        return [(index[0], index[1]) for index in path]
 
-        pathfinder.add_root((self.entity.x, self.entity.y))  # Start position
+    def path_is_valid(self, target_x: int, target_y: int) -> bool:
+        """Return True if the stored path can still be followed towards the
+        target."""
+        if not self.path:
+            return False
+
+        next_x, next_y = self.path[0]
+        end_x, end_y = self.path[-1]
+        gamemap = self.entity.gamemap
+
+        if self.entity.c_distance(next_x, next_y) != 1:
+            return False  # Displaced off the path, e.g. by a swap.
+        if not gamemap.walkable[next_x, next_y]:
+            return False
+        if gamemap.get_blocking_entity_at_location(next_x, next_y):
+            return False
+        return (max(abs(target_x - end_x), abs(target_y - end_y))
+                <= PATH_REPLAN_TOLERANCE)
+
+    def move_towards(self, target_x: int, target_y: int) -> None:
+        """Take the next step towards the target, re-planning the stored path
+        only when it can no longer be followed."""
+        if self.path_is_valid(target_x, target_y):
+            path_stats["reused"] += 1
+        else:
+            path_stats["replanned"] += 1
+            self.path = self.get_path_to(target_x, target_y)
 
-        # Compute the path to the destination and remove the starting point
-        path: List[List[int]] = pathfinder.path_to((dest_x, dest_y))[1:].tolist()
+        if self.path:
+            dest_x, dest_y = self.path.pop(0)
+            return MovementAction(
+                self.entity, dest_x - self.entity.x, dest_y - self.entity.y,
+            ).perform()
 
-        # Convert from List[List[int]] to List[Tuple[int, int]].
-        return [(index[0], index[1]) for index in path]
+        return WaitAction(self.entity).perform()
 
     def get_actors_in_fov(self, fov_radius: int = 8) -> List[Actor]:
-        actor_list = []
-        fov_mask = compute_fov(
-                self.entity.parent.tiles["transparent"],
-                (self.entity.x, self.entity.y),
-                radius=fov_radius,
+        fov_mask = self.entity.gamemap.compute_fov(
+                self.entity.x, self.entity.y, fov_radius
         )
-        iterator = np.nditer(fov_mask, flags=["multi_index"])
-        for value in iterator:
-            if value:
-                x, y = iterator.multi_index
-                actor = self.entity.gamemap.get_actor_at_location(x, y)
-                if actor and actor is not self.entity:
-                    actor_list += [actor]
-        return actor_list
+        actors, locations = self.entity.gamemap.get_actor_locations()
+        # Look up every actor's tile in the mask at once.
+        x, y = locations[:, 0], locations[:, 1]
+        in_fov = fov_mask[x, y]
+        # Keep the row by row order of a scan over the map.
+        order = np.argsort(y * fov_mask.shape[0] + x, kind="stable")
+        return [
+            actors[i] for i in order[in_fov[order]].tolist()
+            if actors[i] is not self.entity
+        ]
+
+    def threat_to(self, actor: Actor) -> Tuple[float, float]:
+        """Return this actor's chance to kill `actor` with one attack and
+        the damage it is expected to deal."""
+        odds = fighter_odds(self.entity.fighter, actor.fighter)
+        return odds.kill_chance(actor.fighter.hp), odds.expected_damage
+
+    def choose_target(self, targets: List[Actor]) -> Optional[Actor]:
+        """Return the closest of the targets. Between equally close ones,
+        prefer the one this actor is most likely to kill, then the one it
+        would hurt most."""
+        if not targets:
+            return None
+        distances = [self.get_distance_to_target_actor(t) for t in targets]
+        closest = min(distances)
+        candidates = [
+            target for target, distance in zip(targets, distances)
+            if distance == closest
+        ]
+        if len(candidates) == 1:
+            return candidates[0]
+        # max() keeps the first of equal threats, the old choice.
+        return max(candidates, key=self.threat_to)
 
     def get_distance_to_target_actor(self, actor: Actor) -> int:
         """Calculate chebyshev distance bewteen self and target."""
@@ -86,6 +149,13 @@ class ConfusedEnemy(BaseAI):
         self.previous_ai = previous_ai
         self.turns_remaining = turns_remaining
 
+    def clone(self, entity: Actor) -> BaseAI:
+        clone = super().clone(entity)
+        assert isinstance(clone, ConfusedEnemy)
+        if self.previous_ai:
+            clone.previous_ai = self.previous_ai.clone(entity)
+        return clone
+
     def perform(self) -> None:
         """Revert the AI back o the original state if the effect has run its
         course."""
@@ -96,7 +166,7 @@ class ConfusedEnemy(BaseAI):
             self.entity.ai = self.previous_ai
         else:
             # Pick a random direction
-            direction_x, direction_y = random.choice([
+            direction_x, direction_y = self.engine.rng.choice([
                     (-1, -1),  # Northwest
                     (0, -1),  # North
                     (1, -1),  # Northeast
@@ -120,15 +190,8 @@ class HostileEnemy(BaseAI):
         self.path: List[Tuple[int, int]] = []
 
     def perform(self) -> None:
-        target_list = select_group_from_list(
-                super().get_actors_in_fov(), ActorGroups.ALLIES)
-        closest_target: Actor = None
-        if target_list:
-            closest_target = target_list[0]
-        for target in target_list:
-            if (super().get_distance_to_target_actor(target) <
-                    super().get_distance_to_target_actor(closest_target)):
-                closest_target = target
+        closest_target = self.choose_target(select_group_from_list(
+                super().get_actors_in_fov(), ActorGroups.ALLIES))
         if not closest_target:
             return WaitAction(self.entity).perform()
 
@@ -140,15 +203,7 @@ class HostileEnemy(BaseAI):
         if distance <= 1:
             return MeleeAction(self.entity, dx, dy).perform()
 
-        self.path = self.get_path_to(target.x, target.y)
-
-        if self.path:
-            dest_x, dest_y = self.path.pop(0)
-            return MovementAction(
-                self.entity, dest_x - self.entity.x, dest_y - self.entity.y,
-            ).perform()
-
-        return WaitAction(self.entity).perform()
+        return self.move_towards(target.x, target.y)
 
 
 class AlliedFollower(BaseAI):
@@ -157,15 +212,8 @@ class AlliedFollower(BaseAI):
         self.path: List[Tuple[int, int]] = []
 
     def perform(self) -> None:
-        target_list = select_group_from_list(
-                super().get_actors_in_fov(), ActorGroups.ENEMIES)
-        closest_target: Actor = None
-        if target_list:
-            closest_target = target_list[0]
-        for target in target_list:
-            if (super().get_distance_to_target_actor(target) <
-                    super().get_distance_to_target_actor(closest_target)):
-                closest_target = target
+        closest_target = self.choose_target(select_group_from_list(
+                super().get_actors_in_fov(), ActorGroups.ENEMIES))
         if not closest_target:
             target = self.engine.player
         else:
@@ -179,12 +227,5 @@ class AlliedFollower(BaseAI):
             if target.group == ActorGroups.ENEMIES:
                 return MeleeAction(self.entity, dx, dy).perform()
             return WaitAction(self.entity).perform()
-        self.path = self.get_path_to(target.x, target.y)
 
-        if self.path:
-            dest_x, dest_y = self.path.pop(0)
-            return MovementAction(
-                self.entity, dest_x - self.entity.x, dest_y - self.entity.y,
-            ).perform()
-
-        return WaitAction(self.entity).perform()
+        return self.move_towards(target.x, target.y)
@@ -1,12 +1,13 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import Any, TypeVar, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from engine import Engine
     from entity import Entity
     from game_map import GameMap
 
+C = TypeVar("C", bound="BaseComponent")
 
 class BaseComponent:
     parent: Entity  # Owning entity reference
@@ -18,3 +19,14 @@ class BaseComponent:
     @property
     def engine(self) -> Engine:
         return self.gamemap.engine
+
+    def clone(self: C, parent: Any) -> C:
+        """Return a copy of this component owned by `parent`.
+
+        Attributes are copied shallowly, components holding mutable state
+        copy it themselves.
+        """
+        clone = object.__new__(type(self))
+        clone.__dict__ = self.__dict__.copy()
+        clone.parent = parent
+        return clone
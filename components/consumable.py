@@ -2,8 +2,11 @@ from __future__ import annotations
 
 from typing import Optional, TYPE_CHECKING
 
+import numpy as np  # type: ignore
+
 import actions
 import color
+import combat
 import components.ai
 import components.inventory
 from components.base_component import BaseComponent
@@ -110,34 +113,35 @@ class FireballDamageConsumable(Consumable):
                     consumer, self.parent, xy),
         )
 
+    def report_hit(self, actor: Actor, damage: int) -> None:
+        if damage > 0:
+            self.engine.message_log.add_message(
+                    f"The {actor.name} is engulfed in a fiery explosion, "
+                    f"taking {self.damage} damage!"
+            )
+        elif damage == 0:
+            self.engine.message_log.add_message(
+                    f"The {actor.name} is engulfed in a fiery explosion, "
+                    "but shrugs it off, taking no damage!"
+            )
+        else:
+            self.engine.message_log.add_message(
+                    f"The {actor.name} dodges out of the way of the fiery "
+                    "explosion, avoiding damage!"
+            )
+
     def activate(self, action: actions.ItemAction) -> None:
         target_xy = action.target_xy
 
         if not self.engine.game_map.visible[target_xy]:
             raise Impossible("You cannot target an area that you cannot see.")
 
-        targets_hit = False
-        for actor in self.engine.game_map.actors:
-            if actor.c_distance(*target_xy) <= self.radius:
-                damage_taken = actor.fighter.take_damage(self.damage)
-                if damage_taken and damage_taken > 0:
-                    self.engine.message_log.add_message(
-                            f"The {actor.name} is engulfed in a fiery explosion, "
-                            f"taking {self.damage} damage!"
-                    )
-                elif damage_taken and damage_taken == 0:
-                    self.engine.message_log.add_message(
-                            f"The {actor.name} is engulfed in a fiery explosion, "
-                            "but shrugs it off, taking no damage!"
-                    )
-                else:
-                    self.engine.message_log.add_message(
-                            f"The {actor.name} dodges out of the way of the fiery "
-                            "explosion, avoiding damage!"
-                    )
-                targets_hit = True
-
-        if not targets_hit:
+        targets = self.engine.game_map.get_actors_within(
+                *target_xy, self.radius)
+        combat.resolve_attacks(
+                self.engine, targets, self.damage, self.report_hit)
+
+        if not targets:
             raise Impossible("There are no targets in the radius.")
         self.consume()
 
@@ -147,37 +151,44 @@ class LightningDamageConsumable(Consumable):
         self.damage = damage
         self.maximum_range = maximum_range
 
+    def report_hit(self, target: Actor, damage_taken: int) -> None:
+        if damage_taken > 0:
+            self.engine.message_log.add_message(
+                    f"A lightning bolt strikes the {target.name} with a loud "
+                    f"thunder, for {self.damage} damage!"
+            )
+        elif damage_taken == 0:
+            self.engine.message_log.add_message(
+                    f"A lightning bolt strikes the {target.name} with a loud "
+                    f"thunder, but they shrug it off, taking no damage!"
+            )
+        else:
+            self.engine.message_log.add_message(
+                    f"A lightning bolt strikes with a loud thunder, but the "
+                    f"{target.name} dodges out of the way, avoiding damage!"
+            )
+
     def activate(self, action: actions.ItemAction) -> None:
         consumer = action.entity
         target = None
-        closest_distance = self.maximum_range + 1
-
-        for actor in self.engine.game_map.actors:
-            if (actor is not consumer and
-                    self.parent.gamemap.visible[actor.x, actor.y]):
-                distance = consumer.distance(actor.x, actor.y)
-
-                if distance < closest_distance:
-                    target = actor
-                    closest_distance = distance
+        game_map = self.engine.game_map
+
+        # The closest visible actor in range, the first one found on ties.
+        actors, locations = game_map.get_actor_locations()
+        delta = locations - (consumer.x, consumer.y)
+        distance = np.sqrt((delta * delta).sum(axis=1))
+        candidates = (
+            game_map.visible[locations[:, 0], locations[:, 1]]
+            & (distance < self.maximum_range + 1)
+        )
+        candidates[[actor is consumer for actor in actors]] = False
+        if candidates.any():
+            target = actors[int(np.argmin(np.where(
+                    candidates, distance, np.inf)))]
 
         if target:
-            damage_taken = target.fighter.take_damage(self.damage)
-            if damage_taken and damage_taken > 0:
-                self.engine.message_log.add_message(
-                        f"A lightning bolt strikes the {target.name} with a loud "
-                        f"thunder, for {self.damage} damage!"
-                )
-            elif damage_taken and damage_taken == 0:
-                self.engine.message_log.add_message(
-                        f"A lightning bolt strikes the {target.name} with a loud "
-                        f"thunder, but they shrug it off, taking no damage!"
-                )
-            else:
-                self.engine.message_log.add_message(
-                        f"A lightning bolt strikes with a loud thunder, but the "
-                        f"{target.name} dodges out of the way, avoiding damage!"
-                )
+            combat.resolve_attacks(
+                    self.engine, [target], self.damage, self.report_hit)
             self.consume()
         else:
             raise Impossible("No enemy is close enough to strike.")
@@ -13,59 +13,45 @@ if TYPE_CHECKING:
 class Equipment(BaseComponent):
     parent: Actor
 
-    def __init__(self, parts: List[Item] = [], max_parts: int = 3):
-        self.parts = parts
+    def __init__(
+            self, parts: Optional[List[Item]] = None, max_parts: int = 3):
+        self.parts = parts if parts is not None else []
         self.max_parts = max_parts
-
-    @property
-    def avoidance_bonus(self) -> int:
-        bonus = 0
-
-        for part in self.parts:
-            if part.equippable is not None:
-                bonus += part.equippable.avoidance_bonus
-
-        return bonus
-
-    @property
-    def defense_bonus(self) -> int:
-        bonus = 0
-
-        for part in self.parts:
-            if part.equippable is not None:
-                bonus += part.equippable.defense_bonus
-
-        return bonus
-
-    @property
-    def dice_count_bonus(self) -> int:
-        bonus = 0
-
+        self.update_bonuses()
+
+    def clone(self, parent: Actor) -> Equipment:
+        """Return a copy for `parent`, whose inventory must already be a
+        copy of this one's owner's inventory."""
+        clone = super().clone(parent)
+        # Equipped parts are always carried, so use the copies carried by
+        # the new owner.
+        items = self.parent.inventory.items
+        clone.parts = [
+            parent.inventory.items[items.index(part)] for part in self.parts
+        ]
+        return clone
+
+    def update_bonuses(self) -> None:
+        """Recompute the summed bonuses of the equipped parts."""
+        avoidance = defense = dice_count = dice_sides = power = 0
         for part in self.parts:
             if part.equippable is not None:
-                bonus += part.equippable.dice_count_bonus
-
-        return bonus
-
-    @property
-    def dice_sides_bonus(self) -> int:
-        bonus = 0
-
-        for part in self.parts:
-            if part.equippable is not None:
-                bonus += part.equippable.dice_sides_bonus
-
-        return bonus
-
-    @property
-    def power_bonus(self) -> int:
-        bonus = 0
-
-        for part in self.parts:
-            if part.equippable is not None:
-                bonus += part.equippable.power_bonus
-
-        return bonus
+                avoidance += part.equippable.avoidance_bonus
+                defense += part.equippable.defense_bonus
+                dice_count += part.equippable.dice_count_bonus
+                dice_sides += part.equippable.dice_sides_bonus
+                power += part.equippable.power_bonus
+        self.avoidance_bonus = avoidance
+        self.defense_bonus = defense
+        self.dice_count_bonus = dice_count
+        self.dice_sides_bonus = dice_sides
+        self.power_bonus = power
+
+    def parts_changed(self) -> None:
+        """Must be called after `parts` changes, to refresh the cached
+        bonuses and the owner's stats."""
+        self.update_bonuses()
+        self.parent.fighter.update_stats()
 
     def item_is_equipped(self, item: Item) -> bool:
         for part in self.parts:
@@ -90,6 +76,7 @@ class Equipment(BaseComponent):
             raise Impossible("This part is already equipped.")
 
         self.parts.append(item)
+        self.parts_changed()
 
         # Add bonus health if the item conveys it
         if item.equippable.health_bonus > 0:
@@ -110,6 +97,7 @@ class Equipment(BaseComponent):
             self.parent.fighter.max_hp -= item.equippable.health_bonus
 
         self.parts.remove(item)
+        self.parts_changed()
 
     def toggle_equip(self, item: Item, add_message: bool = True) -> None:
         if not self.item_is_equipped(item):
@@ -1,33 +1,35 @@
 from __future__ import annotations
 
 from typing import Optional, TYPE_CHECKING
-import random
 
 import color
 from components.base_component import BaseComponent
 from render_order import RenderOrder
 
 if TYPE_CHECKING:
+    import random
+
     from entity import Actor
 
 
 DEFENSE_ROLL_CHANCE = 0.10
 
 
-def calculate_if_attack_avoided(avoidance: int) -> bool:
+def calculate_if_attack_avoided(avoidance: int, rng: random.Random) -> bool:
     avoid_chance = ((float(avoidance)/(float(avoidance) + 10.0)) * 0.75)
-    if random.random() <= avoid_chance:
+    if rng.random() <= avoid_chance:
         return True
     return False
 
 
-def calculate_reduction_from_defense(damage: int, defense: int) -> int:
+def calculate_reduction_from_defense(
+        damage: int, defense: int, rng: random.Random) -> int:
     number_of_defense_rolls = max(0, defense - damage)
     if number_of_defense_rolls == 0:
         return 0
     damage_received: int = damage
     for i in range(number_of_defense_rolls):
-        if random.random() <= DEFENSE_ROLL_CHANCE:
+        if rng.random() <= DEFENSE_ROLL_CHANCE:
             damage_received -= 1
     return damage_received
 
@@ -45,6 +47,13 @@ class Fighter(BaseComponent):
         self.base_power = base_power
         self.base_dice_count = base_dice_count
         self.base_dice_sides = base_dice_sides
+        # Totals including equipment, set by update_stats() once the owner's
+        # equipment is known.
+        self.avoidance = base_avoidance
+        self.defense = base_defense
+        self.dice_count = base_dice_count
+        self.dice_sides = base_dice_sides
+        self.power = base_power
 
     @property
     def hp(self) -> int:
@@ -53,6 +62,7 @@ class Fighter(BaseComponent):
     @hp.setter
     def hp(self, value: int) -> None:
         self._hp = max(0, min(value, self.max_hp))
+        self.gamemap.entity_changed(self.parent)
         if self._hp == 0 and self.parent.ai:
             self.die()
 
@@ -60,63 +70,24 @@ class Fighter(BaseComponent):
     def attack_string(self) -> str:
         return f"{self.dice_count}d{self.dice_sides}+{self.power}"
 
-    @property
-    def avoidance(self) -> int:
-        return self.base_avoidance + self.avoidance_bonus
-
-    @property
-    def defense(self) -> int:
-        return self.base_defense + self.defense_bonus
-
-    @property
-    def dice_count(self) -> int:
-        return self.base_dice_count + self.dice_count_bonus
-
-    @property
-    def dice_sides(self) -> int:
-        return self.base_dice_sides + self.dice_sides_bonus
-
-    @property
-    def power(self) -> int:
-        return self.base_power + self.power_bonus
+    def update_stats(self) -> None:
+        """Recompute the total stats from the base stats and the equipment
+        bonuses.
 
-    @property
-    def avoidance_bonus(self) -> int:
-        if self.parent.equipment:
-            return self.parent.equipment.avoidance_bonus
-
-    @property
-    def defense_bonus(self) -> int:
-        if self.parent.equipment:
-            return self.parent.equipment.defense_bonus
-        else:
-            return 0
-
-    @property
-    def dice_count_bonus(self) -> int:
-        if self.parent.equipment:
-            return self.parent.equipment.dice_count_bonus
-        else:
-            return 0
-
-    @property
-    def dice_sides_bonus(self) -> int:
-        if self.parent.equipment:
-            return self.parent.equipment.dice_sides_bonus
-        else:
-            return 0
-
-    @property
-    def power_bonus(self) -> int:
-        if self.parent.equipment:
-            return self.parent.equipment.power_bonus
-        else:
-            return 0
+        The totals are cached, so this must be called after a base stat or
+        the equipped parts change.
+        """
+        equipment = self.parent.equipment
+        self.avoidance = self.base_avoidance + equipment.avoidance_bonus
+        self.defense = self.base_defense + equipment.defense_bonus
+        self.dice_count = self.base_dice_count + equipment.dice_count_bonus
+        self.dice_sides = self.base_dice_sides + equipment.dice_sides_bonus
+        self.power = self.base_power + equipment.power_bonus
 
     def attack(self) -> int:
         total_damage = 0
         for i in range(self.dice_count):
-            total_damage += random.randint(1, self.dice_sides)
+            total_damage += self.engine.rng.randint(1, self.dice_sides)
         total_damage += self.power
         return total_damage
 
@@ -134,6 +105,7 @@ class Fighter(BaseComponent):
         self.parent.ai = None
         self.parent.name = f"remains of {self.parent.name}"
         self.parent.render_order = RenderOrder.CORPSE
+        self.gamemap.entity_changed(self.parent)
 
         self.engine.message_log.add_message(death_message, death_message_color)
 
@@ -157,9 +129,10 @@ class Fighter(BaseComponent):
     def take_damage(self, amount: int) -> Optional[int]:
         """Calculate damage taken, first checking for avoidance."""
         # Check if damage avoided
-        if calculate_if_attack_avoided(self.avoidance):
+        rng = self.engine.rng
+        if calculate_if_attack_avoided(self.avoidance, rng):
             return None
-        reduction = calculate_reduction_from_defense(amount, self.defense)
+        reduction = calculate_reduction_from_defense(amount, self.defense, rng)
         damage_taken = max(0, amount - reduction)
         self.hp -= damage_taken
         return damage_taken
@@ -62,6 +62,7 @@ class Level(BaseComponent):
 
     def increase_power(self, amount: int = 1) -> None:
         self.parent.fighter.base_power += amount
+        self.parent.fighter.update_stats()
 
         self.engine.message_log.add_message("You feel stronger!")
 
@@ -69,6 +70,7 @@ class Level(BaseComponent):
 
     def increase_defense(self, amount: int = 1) -> None:
         self.parent.fighter.base_defense += amount
+        self.parent.fighter.update_stats()
 
         self.engine.message_log.add_message("You feel faster!")
 
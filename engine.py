@@ -1,14 +1,13 @@
 from __future__ import annotations
 
-import lzma
-import pickle
-from typing import TYPE_CHECKING
+import random
+from typing import Optional, TYPE_CHECKING
 
 from tcod.console import Console
-from tcod.map import compute_fov
 
 import exceptions
 from message_log import MessageLog
+from profiling import profiled, profiler
 import render_functions
 
 if TYPE_CHECKING:
@@ -20,28 +19,38 @@ class Engine:
     game_map: GameMap
     game_world: GameWorld
 
-    def __init__(self, player: Actor):
+    def __init__(self, player: Actor, seed: Optional[int] = None):
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        # Every random roll in a game goes through this, so a seed replays
+        # the same game. It is saved along with the engine.
+        self.rng = random.Random(seed)
         self.message_log = MessageLog()
         self.mouse_location = (0, 0)
         self.player = player
+        self.turn = 0
 
+    @profiled("engine.handle_enemy_turns")
     def handle_enemy_turns(self) -> None:
-        for entity in set(self.game_map.actors) - {self.player}:
-            if entity.ai:
+        self.turn += 1
+        profiler.start_turn()
+        for entity in list(self.game_map.actors):
+            if entity is not self.player and entity.ai:
                 try:
-                    entity.ai.perform()
+                    profiler.run_ai(entity.ai)
                 except exceptions.Impossible:
                     pass  # Ignore impossible action exceptions from AI
 
+    @profiled("engine.update_fov")
     def update_fov(self) -> None:
         """Recompute the visble area based on the players point of view."""
-        self.game_map.visible[:] = compute_fov(
-            self.game_map.tiles["transparent"],
-            (self.player.x, self.player.y),
-            radius=8,
+        self.game_map.visible[:] = self.game_map.compute_fov(
+            self.player.x, self.player.y, radius=8
         )
         self.game_map.explored |= self.game_map.visible
 
+    @profiled("engine.render")
     def render(self, console: Console) -> None:
         self.game_map.render(console)
 
@@ -65,8 +74,12 @@ class Engine:
         render_functions.render_names_at_location(
                 console=console, x=21, y=41, engine=self)
 
-    def save_as(self, filename: str) -> None:
+        if profiler.show_overlay:
+            render_functions.render_profiler_overlay(
+                    console=console, x=console.width - 30, y=0)
+
+    def save_as(self, filename: str, compression: str = "zlib") -> None:
         """Save this Engine instance as a compressed file."""
-        save_data = lzma.compress(pickle.dumps(self))
-        with open(filename, "wb") as f:
-            f.write(save_data)
+        from savefile import save_engine
+
+        save_engine(self, filename, compression)
@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import copy
 import math
 from typing import Optional, Tuple, Type, TypeVar, TYPE_CHECKING, Union
 
@@ -27,6 +26,7 @@ class Entity:
     """
 
     parent: Union[GameMap, Inventory]
+    _blocks_movement: bool
 
     def __init__(
             self,
@@ -49,33 +49,69 @@ class Entity:
         if parent:
             # If parent isn't provided now then it will be set later.
             self.parent = parent
-            parent.entities.add(self)
+            parent.add_entity(self)
 
     @property
     def gamemap(self) -> GameMap:
         return self.parent.gamemap
 
+    @property
+    def blocks_movement(self) -> bool:
+        return self._blocks_movement
+
+    @blocks_movement.setter
+    def blocks_movement(self, value: bool) -> None:
+        parent = getattr(self, "parent", None)
+        if (parent is None or parent is not parent.gamemap
+                or value == self._blocks_movement):
+            self._blocks_movement = value
+            return
+        # Keep the maps movement costs in step, e.g. when an actor dies.
+        parent.update_blocking(self.x, self.y, value)
+        self._blocks_movement = value
+        parent.entity_changed(self)
+
+    def clone(self: T) -> T:
+        """Return a copy of this entity without a parent.
+
+        Plain data such as the name, char and color is shared with this
+        entity, components are copied.
+        """
+        clone = object.__new__(type(self))
+        clone.__dict__ = self.__dict__.copy()
+        clone.__dict__.pop("parent", None)
+        return clone
+
     def spawn(self: T, gamemap: GameMap, x: int, y: int) -> T:
         """Spawn a copy of this instance at the given location."""
-        clone = copy.deepcopy(self)
+        clone = self.clone()
         clone.x = x
         clone.y = y
         clone.parent = gamemap
-        gamemap.entities.add(clone)
+        gamemap.add_entity(clone)
         return clone
 
     def place(self, x: int, y: int, gamemap: Optional[GameMap] = None) -> None:
         """
         Place this entity at a new location. Handles moving across GameMaps.
         """
-        self.x = x
-        self.y = y
         if gamemap:
             if hasattr(self, "parent"):  # Possibly uninitialized
                 if self.parent is self.gamemap:
-                    self.gamemap.entities.remove(self)
+                    self.gamemap.remove_entity(self)
             self.parent = gamemap
-            gamemap.entities.add(self)
+            if self in gamemap.entities:
+                # Already registered, e.g. passed to the GameMap constructor.
+                gamemap.relocate_entity(self, x, y)
+            else:
+                self.x = x
+                self.y = y
+                gamemap.add_entity(self)
+        elif hasattr(self, "parent") and self.parent is self.gamemap:
+            self.gamemap.relocate_entity(self, x, y)
+        else:
+            self.x = x
+            self.y = y
 
     def distance(self, x: int, y: int) -> float:
         """ Return the distance between the current entity and the given (x, y)
@@ -90,8 +126,7 @@ class Entity:
 
     def move(self, dx: int, dy: int) -> None:
         # move the entity by a given amount
-        self.x += dx
-        self.y += dy
+        self.place(self.x + dx, self.y + dy)
 
 
 class Actor(Entity):
@@ -135,6 +170,17 @@ class Actor(Entity):
         self.level = level
         self.level.parent = self
 
+        self.fighter.update_stats()
+
+    def clone(self) -> Actor:
+        clone = super().clone()
+        clone.fighter = self.fighter.clone(clone)
+        clone.inventory = self.inventory.clone(clone)
+        clone.equipment = self.equipment.clone(clone)
+        clone.level = self.level.clone(clone)
+        clone.ai = self.ai.clone(clone) if self.ai else None
+        return clone
+
     @property
     def is_alive(self) -> bool:
         """Returns True as long as this actor can perform actions."""
@@ -170,3 +216,11 @@ class Item(Entity):
         self.equippable = equippable
         if self.equippable:
             self.equippable.parent = self
+
+    def clone(self) -> Item:
+        clone = super().clone()
+        if self.consumable:
+            clone.consumable = self.consumable.clone(clone)
+        if self.equippable:
+            clone.equippable = self.equippable.clone(clone)
+        return clone
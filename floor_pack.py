@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""Packs of pre-generated floors, for fast starts and fixed tournament seeds.
+
+A pack holds the floors of many runs, generated and checked ahead of time,
+in one uncompressed file of the save format. Its layers are memory mapped
+when it is opened, so loading a floor copies one slice of the file rather
+than running the floor generator. Packed floors are exactly the floors the
+generator would make for the same seed, the pack only saves time.
+
+Example::
+
+    python floor_pack.py build floors.pack --seeds 1000 --floors 6
+    python floor_pack.py info floors.pack
+    AUTOMATON_FLOOR_PACK=floors.pack python main.py
+"""
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import multiprocessing
+import os
+import time
+from typing import (
+        Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+)
+
+import numpy as np  # type: ignore
+
+from game_map import zone_generator
+import procgen
+from procgen import FloorPlan
+import savefile
+import tile_types
+
+if TYPE_CHECKING:
+    from game_map import GameWorld
+
+# One row per floor. Locations are (x, y), the up stairs (-1, -1) when the
+# floor has none. Spawns of a floor are rows spawn_start to spawn_stop of
+# the spawns layer.
+FLOOR_DT = np.dtype([
+    ("seed", np.int64),
+    ("floor", np.int32),
+    ("generator", np.uint8),  # Index into the pack's generator names.
+    ("player_start", np.int32, 2),
+    ("downstairs", np.int32, 2),
+    ("upstairs", np.int32, 2),
+    ("spawn_start", np.int64),
+    ("spawn_stop", np.int64),
+])
+
+SPAWN_DT = np.dtype([
+    ("prototype", np.uint16),  # Index into the pack's prototype names.
+    ("x", np.int32),
+    ("y", np.int32),
+])
+
+
+class FloorPack:
+    """A floor pack opened for reading."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        state, layers, _ = savefile.read_save(filename)
+        info = state.get("floor_pack")
+        if info is None:
+            raise savefile.SaveFormatError(f"{filename} is not a floor pack.")
+        self.settings: Dict[str, int] = info["settings"]
+        self.generators: List[str] = info["generators"]
+        self.prototypes: List[str] = info["prototypes"]
+        # Memory mapped, nothing is read until a floor is loaded.
+        self.tiles = layers["tiles"]  # Tile ids by width, height, floor.
+        self.floors = layers["floors"]
+        self.spawns = layers["spawns"]
+        self.index: Dict[Tuple[int, int], int] = {
+            (seed, floor): row for row, (seed, floor) in enumerate(zip(
+                self.floors["seed"].tolist(), self.floors["floor"].tolist()))
+        }
+        self.seeds = sorted({seed for seed, _ in self.index})
+
+    def __len__(self) -> int:
+        return len(self.floors)
+
+    def matches(self, game_world: GameWorld) -> bool:
+        """Return True if the floors were generated with the settings of
+        `game_world`."""
+        return self.settings == game_world.generator_settings
+
+    def find(self, seed: int, floor: int, generator: str) -> Optional[int]:
+        """Return the row of a floor made by `generator`, if packed."""
+        row = self.index.get((seed, floor))
+        if row is None:
+            return None
+        if self.generators[self.floors["generator"][row]] != generator:
+            return None
+        return row
+
+    def has_floor(self, seed: int, floor: int, generator: str) -> bool:
+        return self.find(seed, floor, generator) is not None
+
+    def get_plan(
+            self, seed: int, floor: int, generator: str
+    ) -> Optional[FloorPlan]:
+        """Return the plan of a floor made by `generator`, or None if the
+        pack doesn't have it."""
+        row = self.find(seed, floor, generator)
+        if row is None:
+            return None
+        record = self.floors[row]
+        width, height = self.tiles.shape[:2]
+        plan = FloorPlan(width, height, floor)
+        plan.tiles = np.array(self.tiles[:, :, row], order="F")
+        plan.player_start = tuple(record["player_start"].tolist())
+        plan.downstairs_location = tuple(record["downstairs"].tolist())
+        upstairs = tuple(record["upstairs"].tolist())
+        plan.upstairs_location = upstairs if upstairs != (-1, -1) else None
+        spawns = self.spawns[record["spawn_start"]:record["spawn_stop"]]
+        plan.spawns = [
+            (self.prototypes[prototype], x, y) for prototype, x, y in zip(
+                spawns["prototype"].tolist(), spawns["x"].tolist(),
+                spawns["y"].tolist())
+        ]
+        return plan
+
+
+def validate_plan(plan: FloorPlan) -> List[str]:
+    """Return what is wrong with a floor plan, nothing if it is playable."""
+    problems = []
+    walkable = tile_types.TILES["walkable"][plan.tiles]
+    width, height = walkable.shape
+    for name, x, y in plan.spawns:
+        if not (0 <= x < width and 0 <= y < height) or not walkable[x, y]:
+            problems.append(f"{name} spawns off the floor at {(x, y)}")
+    if not walkable[plan.player_start]:
+        problems.append("the player starts off the floor")
+    targets = [(x, y) for _, x, y in plan.spawns if walkable[x, y]]
+    if plan.upstairs_location is not None:
+        targets.append(plan.upstairs_location)
+    for x, y in procgen.find_unreachable(plan, targets):
+        problems.append(f"{(x, y)} can't be reached")
+    return problems
+
+
+def generate_run(
+        settings: Dict[str, int],
+        zone_generators: Dict[int, str],
+        seed: int,
+        floors: int,
+) -> List[Tuple[int, str, Optional[FloorPlan], List[str]]]:
+    """Generate and check the first `floors` floors of the run with `seed`.
+
+    Returns the floor, generator name, plan and problems of each floor.
+    Floors which fail to generate have no plan.
+    """
+    results: List[Tuple[int, str, Optional[FloorPlan], List[str]]] = []
+    for floor in range(1, floors + 1):
+        name = zone_generator(zone_generators, floor)
+        try:
+            plan = procgen.GENERATORS[name](
+                    **settings, floor=floor, seed=seed)
+        except RuntimeError as exc:
+            results.append((floor, name, None, [str(exc)]))
+            continue
+        results.append((floor, name, plan, validate_plan(plan)))
+    return results
+
+
+def write_pack(
+        filename: str,
+        settings: Dict[str, int],
+        runs: Sequence[Tuple[int, Sequence[Tuple[int, str, FloorPlan]]]],
+) -> int:
+    """Write the floors of `runs`, given as (seed, floors) pairs, to a pack
+    and return its size in bytes."""
+    plans = [
+        (seed, floor, name, plan)
+        for seed, floors in runs for floor, name, plan in floors
+    ]
+    generators = sorted({name for _, _, name, _ in plans})
+    prototypes = sorted(procgen.PROTOTYPES)
+    prototype_ids = {name: i for i, name in enumerate(prototypes)}
+
+    tiles = np.empty(
+            (settings["map_width"], settings["map_height"], len(plans)),
+            dtype=np.uint8, order="F",
+    )
+    floors = np.zeros(len(plans), dtype=FLOOR_DT)
+    spawn_rows: List[Tuple[int, int, int]] = []
+    for row, (seed, floor, name, plan) in enumerate(plans):
+        tiles[:, :, row] = plan.tiles
+        record = floors[row]
+        record["seed"] = seed
+        record["floor"] = floor
+        record["generator"] = generators.index(name)
+        record["player_start"] = plan.player_start
+        record["downstairs"] = plan.downstairs_location
+        record["upstairs"] = plan.upstairs_location or (-1, -1)
+        record["spawn_start"] = len(spawn_rows)
+        spawn_rows += [
+            (prototype_ids[prototype], x, y)
+            for prototype, x, y in plan.spawns
+        ]
+        record["spawn_stop"] = len(spawn_rows)
+    spawns = np.array(spawn_rows, dtype=SPAWN_DT)
+
+    state = {
+        "floor_pack": {
+            "settings": settings,
+            "generators": generators,
+            "prototypes": prototypes,
+        },
+    }
+    return savefile.write_save(
+            filename, state,
+            {"tiles": tiles, "floors": floors, "spawns": spawns},
+            compression="none",
+    )
+
+
+def build(args: argparse.Namespace) -> None:
+    import setup_game
+
+    world = dict(setup_game.WORLD_SETTINGS)
+    zone_generators = world.pop("zone_generators")
+    settings = {
+        name: world[name] for name in (
+            "max_rooms", "room_min_size", "room_max_size",
+            "map_width", "map_height",
+        )
+    }
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+
+    start = time.perf_counter()
+    executor = None
+    if args.workers > 1:
+        executor = ProcessPoolExecutor(
+                max_workers=args.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+        )
+    try:
+        if executor is None:
+            results = [
+                generate_run(settings, zone_generators, seed, args.floors)
+                for seed in seeds
+            ]
+        else:
+            results = list(executor.map(
+                generate_run, itertools.repeat(settings),
+                itertools.repeat(zone_generators), seeds,
+                itertools.repeat(args.floors),
+                chunksize=max(1, len(seeds) // (args.workers * 4)),
+            ))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    runs = []
+    rejected = 0
+    for seed, floors in zip(seeds, results):
+        accepted = []
+        for floor, name, plan, problems in floors:
+            if plan is None or problems:
+                rejected += 1
+                print(f"seed {seed} floor {floor}: {'; '.join(problems)}")
+            else:
+                accepted.append((floor, name, plan))
+        runs.append((seed, accepted))
+    generated = time.perf_counter() - start
+
+    size = write_pack(args.filename, settings, runs)
+    count = sum(len(floors) for _, floors in runs)
+    print(f"{count} floors in {generated:.1f}s, {rejected} rejected, "
+          f"{size / 2 ** 20:.1f} MiB written to {args.filename}")
+
+
+def info(args: argparse.Namespace) -> None:
+    pack = FloorPack(args.filename)
+    print(f"{len(pack)} floors of {len(pack.seeds)} seeds, "
+          f"{os.path.getsize(args.filename) / 2 ** 20:.1f} MiB")
+    print(f"settings: {pack.settings}")
+    for i, name in enumerate(pack.generators):
+        count = int((pack.floors["generator"] == i).sum())
+        print(f"  {name:<8} {count} floors")
+
+    start = time.perf_counter()
+    for record in pack.floors:
+        pack.get_plan(int(record["seed"]), int(record["floor"]),
+                      pack.generators[record["generator"]])
+    seconds = time.perf_counter() - start
+    print(f"{1e6 * seconds / max(1, len(pack)):.0f} us to load a floor plan")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser(
+            "build", help="Generate floors with the settings of new games.")
+    build_parser.add_argument("filename")
+    build_parser.add_argument("--seeds", type=int, default=100,
+                              help="Number of runs to generate.")
+    build_parser.add_argument("--first-seed", type=int, default=0)
+    build_parser.add_argument("--floors", type=int, default=6,
+                              help="Floors to generate per run.")
+    build_parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 1,
+            help="Worker processes, 1 to run in this process.")
+    build_parser.set_defaults(func=build)
+
+    info_parser = subparsers.add_parser(
+            "info", help="Describe a pack and time loading its floors.")
+    info_parser.add_argument("filename")
+    info_parser.set_defaults(func=info)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
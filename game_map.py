@@ -1,28 +1,76 @@
 from __future__ import annotations
-from typing import Iterable, Iterator, Optional, TYPE_CHECKING
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+import multiprocessing
+import os
+import tempfile
+from typing import (
+        IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple,
+        TYPE_CHECKING,
+)
 
 import numpy as np  # type: ignore
 from tcod.console import Console
+from tcod.map import compute_fov
+import tcod.path
 
+from column_store import ColumnStore
 from entity import Actor, Item
+from profiling import profiled
 import tile_types
 
 if TYPE_CHECKING:
     from engine import Engine
     from entity import Entity
+    from floor_pack import FloorPack
+    from procgen import FloorPlan
+
+
+FovKey = Tuple[int, int, int, int]  # x, y, radius, tiles revision
+
+# How far from the player allies who follow them down the stairs may land,
+# and from occupied stairs the player looks for a free tile first.
+FOLLOWER_RADIUS = 2
 
 
 class GameMap:
+    # Number of FOV masks kept per map before the least recently used is
+    # evicted.
+    fov_cache_size = 64
+    # Mirror entity fields in a ColumnStore, so queries over every entity
+    # on the map are done with NumPy instead of a loop over the entities.
+    columnar = True
+
     def __init__(
             self, engine: Engine, width: int, height: int,
             entities: Iterable[Entity] = ()
     ):
         self.engine = engine
         self.width, self.height = width, height
-        self.entities = set(entities)
+        # Entities in the order they were added, used as an ordered set so
+        # that turn order and spawning are reproducible for a given seed.
+        self.entities: Dict[Entity, None] = dict.fromkeys(entities)
+        # The tile id of every cell, see tile_types.TILES.
         self.tiles = np.full(
-                (width, height), fill_value=tile_types.wall, order="F"
+                (width, height), fill_value=tile_types.wall, dtype=np.uint8,
+                order="F",
         )
+        # Properties of each cell's tile, looked up by tiles_changed().
+        self.walkable = np.zeros((width, height), dtype=bool, order="F")
+        self.transparent = np.zeros((width, height), dtype=bool, order="F")
+        # Pathfinding cost of entering each tile. Walls cost 0 (impassable),
+        # open tiles cost 1, plus 10 for each blocking entity standing there.
+        # A lower bonus means more enemies will crowd behind eachother, a
+        # higher one means enemies will take longer paths in order to surround.
+        self.movement_cost = np.zeros((width, height), dtype=np.int8, order="F")
+        # Entities bucketed by the tile they occupy, for fast location lookups.
+        self.entity_index: Dict[Tuple[int, int], List[Entity]] = {}
+        self.columns: Optional[ColumnStore] = (
+                ColumnStore() if self.columnar else None)
+        for entity in self.entities:
+            self._index_entity(entity)
+            if self.columns is not None:
+                self.columns.add(entity)
         self.visible = np.full(
                 (width, height), fill_value=False, order="F"
         )  # currently visible tiles
@@ -31,6 +79,24 @@ class GameMap:
         )  # tiles which have been visble in the past
 
         self.downstairs_location = (0, 0)
+        # Floors below the first have stairs back up where the player starts.
+        self.upstairs_location: Optional[Tuple[int, int]] = None
+
+        # Bumped by tiles_changed() so cached results of the old layout miss.
+        self.tiles_revision = 0
+        self.fov_cache: OrderedDict[FovKey, np.ndarray] = OrderedDict()
+
+        # Distance maps towards each pathing target, valid for one turn.
+        self.distance_maps: Dict[Tuple[int, int], np.ndarray] = {}
+        self.distance_maps_turn = -1
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        # Don't save cached masks and distance maps.
+        state["fov_cache"] = OrderedDict()
+        state["distance_maps"] = {}
+        state["distance_maps_turn"] = -1
+        return state
 
     @property
     def gamemap(self) -> GameMap:
@@ -45,34 +111,199 @@ class GameMap:
             if isinstance(entity, Actor) and entity.is_alive
         )
 
+    def get_actor_locations(self) -> Tuple[List[Actor], np.ndarray]:
+        """Return this maps living actors and an (N, 2) array of their x, y
+        coordinates, in matching order."""
+        if self.columns is not None:
+            rows = self.columns.living_actor_rows()
+            locations = np.stack(
+                    (self.columns.x[rows], self.columns.y[rows]), axis=1
+            ).astype(np.intp)
+            return self.columns.get_entities(rows), locations  # type: ignore
+        actors = list(self.actors)
+        locations = np.array(
+                [(actor.x, actor.y) for actor in actors], dtype=np.intp
+        ).reshape(-1, 2)
+        return actors, locations
+
+    def get_actors_within(self, x: int, y: int, radius: int) -> List[Actor]:
+        """Return the living actors within `radius` tiles (Chebyshev
+        distance) of (x, y)."""
+        actors, locations = self.get_actor_locations()
+        distance = np.abs(locations - (x, y)).max(axis=1, initial=0)
+        return [actors[i] for i in np.flatnonzero(distance <= radius)]
+
     @property
     def items(self) -> Iterator[Item]:
         yield from (entity for entity in self.entities if
                     isinstance(entity, Item))
 
+    def _index_entity(self, entity: Entity) -> None:
+        self.entity_index.setdefault((entity.x, entity.y), []).append(entity)
+        if entity.blocks_movement:
+            self.update_blocking(entity.x, entity.y, True)
+
+    def _unindex_entity(self, entity: Entity) -> None:
+        location = (entity.x, entity.y)
+        bucket = self.entity_index[location]
+        bucket.remove(entity)
+        if not bucket:
+            del self.entity_index[location]
+        if entity.blocks_movement:
+            self.update_blocking(entity.x, entity.y, False)
+
+    def update_blocking(self, x: int, y: int, blocks: bool) -> None:
+        """Add or remove a blocking entity from the movement cost of a
+        tile."""
+        if self.movement_cost[x, y]:  # Walls stay impassable.
+            self.movement_cost[x, y] += 10 if blocks else -10
+
+    def entity_changed(self, entity: Entity) -> None:
+        """Must be called when an entity's hp, blocking, render order,
+        glyph or living state changes, to keep the column store in step."""
+        if self.columns is not None:
+            self.columns.update(entity)
+
+    def hp_changed(self, actors: List[Actor]) -> None:
+        """Like `entity_changed`, for actors of which only hp changed."""
+        if self.columns is not None and actors:
+            self.columns.update_hp(actors)
+
+    def add_entity(self, entity: Entity) -> None:
+        """Add an entity to this map at its current location."""
+        self.entities[entity] = None
+        self._index_entity(entity)
+        if self.columns is not None:
+            self.columns.add(entity)
+
+    def spawn_entities(
+            self, spawns: Iterable[Tuple[Entity, int, int]]
+    ) -> List[Entity]:
+        """Spawn a copy of each prototype at its location, in order."""
+        clones = []
+        for prototype, x, y in spawns:
+            clone = prototype.clone()
+            clone.x = x
+            clone.y = y
+            clone.parent = self
+            clones.append(clone)
+        self.entities.update(dict.fromkeys(clones))
+        for clone in clones:
+            self._index_entity(clone)
+            if self.columns is not None:
+                self.columns.add(clone)
+        return clones
+
+    def remove_entity(self, entity: Entity) -> None:
+        """Remove an entity from this map."""
+        del self.entities[entity]
+        self._unindex_entity(entity)
+        if self.columns is not None:
+            self.columns.remove(entity)
+
+    def relocate_entity(self, entity: Entity, x: int, y: int) -> None:
+        """Move an entity already on this map to a new location."""
+        self._unindex_entity(entity)
+        entity.x = x
+        entity.y = y
+        self._index_entity(entity)
+        if self.columns is not None:
+            self.columns.move(entity)
+
+    def get_entities_at_location(self, x: int, y: int) -> List[Entity]:
+        """Return the entities occupying the given tile."""
+        return self.entity_index.get((x, y), [])
+
     def get_blocking_entity_at_location(
             self, location_x: int, location_y: int
     ) -> Optional[Entity]:
-        for entity in self.entities:
-            if (
-                entity.blocks_movement
-                and entity.x == location_x
-                and entity.y == location_y
-            ):
+        for entity in self.get_entities_at_location(location_x, location_y):
+            if entity.blocks_movement:
                 return entity
         return None
 
     def get_actor_at_location(self, x: int, y: int) -> Optional[Actor]:
-        for actor in self.actors:
-            if actor.x == x and actor.y == y:
-                return actor
+        for entity in self.get_entities_at_location(x, y):
+            if isinstance(entity, Actor) and entity.is_alive:
+                return entity
 
         return None
 
+    def tiles_changed(self) -> None:
+        """Must be called after `tiles` is modified, to invalidate anything
+        derived from the old layout."""
+        self.tiles_revision += 1
+
+        self.walkable[:] = tile_types.TILES["walkable"][self.tiles]
+        self.transparent[:] = tile_types.TILES["transparent"][self.tiles]
+        self.movement_cost[:] = self.walkable
+        for entity in self.entities:
+            if entity.blocks_movement:
+                self.update_blocking(entity.x, entity.y, True)
+
+    def compute_fov(self, x: int, y: int, radius: int) -> np.ndarray:
+        """Return the field of view from (x, y) as a boolean array.
+
+        Results are cached, so the returned array is read-only and shared
+        with every other caller using the same origin and radius.
+        """
+        key = (x, y, radius, self.tiles_revision)
+        fov = self.fov_cache.get(key)
+        if fov is not None:
+            self.fov_cache.move_to_end(key)
+            return fov
+
+        fov = compute_fov(self.transparent, (x, y), radius=radius)
+        fov.flags.writeable = False
+        self.fov_cache[key] = fov
+        if len(self.fov_cache) > self.fov_cache_size:
+            self.fov_cache.popitem(last=False)
+        return fov
+
+    def get_distance_map(self, x: int, y: int) -> np.ndarray:
+        """Return a Dijkstra distance map flowing out from (x, y).
+
+        The map is shared by every actor heading for the same tile, and is
+        computed at most once per turn. Actors reach (x, y) by stepping
+        downhill on it.
+        """
+        if self.distance_maps_turn != self.engine.turn:
+            self.distance_maps.clear()
+            self.distance_maps_turn = self.engine.turn
+
+        distance = self.distance_maps.get((x, y))
+        if distance is None:
+            distance = tcod.path.maxarray(
+                    (self.width, self.height), dtype=np.int32, order="F"
+            )
+            distance[x, y] = 0
+            tcod.path.dijkstra2d(
+                    distance, self.movement_cost, 2, 3, out=distance
+            )
+            distance.flags.writeable = False
+            self.distance_maps[x, y] = distance
+        return distance
+
     def in_bounds(self, x: int, y: int) -> bool:
         """Return True if x and y are inside the bounds of this map."""
         return 0 <= x < self.width and 0 <= y < self.height
 
+    def get_free_tiles_near(
+            self, x: int, y: int, radius: int
+    ) -> List[Tuple[int, int]]:
+        """Return the walkable tiles without a blocking entity within
+        `radius` tiles (Chebyshev distance) of (x, y), nearest first."""
+        free = [
+            (tile_x, tile_y)
+            for tile_x in range(x - radius, x + radius + 1)
+            for tile_y in range(y - radius, y + radius + 1)
+            if self.in_bounds(tile_x, tile_y) and self.walkable[tile_x, tile_y]
+            and not self.get_blocking_entity_at_location(tile_x, tile_y)
+        ]
+        free.sort(key=lambda xy: max(abs(xy[0] - x), abs(xy[1] - y)))
+        return free
+
+    @profiled("game_map.render")
     def render(self, console: Console) -> None:
         """
         Renders the map
@@ -81,11 +312,13 @@ class GameMap:
         If it isn't, but its in the "explored" array, then draw it with the "dark" colors.
         Otherwise, the default is "Shroud"
         """
-        console.tiles_rgb[0:self.width, 0:self.height] = np.select(
-            condlist=[self.visible, self.explored],
-            choicelist=[self.tiles["light"], self.tiles["dark"]],
-            default=tile_types.SHROUD
-        )
+        console.tiles_rgb[0:self.width, 0:self.height] = tile_types.PALETTE[
+            tile_types.palette_index(self.tiles, self.visible, self.explored)
+        ]
+
+        if self.columns is not None:
+            self.render_entities(console, self.columns)
+            return
 
         entities_sorted_for_rendering = sorted(
             self.entities, key=lambda x: x.render_order.value
@@ -98,11 +331,63 @@ class GameMap:
                     x=entity.x, y=entity.y, string=entity.char, fg=entity.color
                 )
 
+    def render_entities(self, console: Console, columns: ColumnStore) -> None:
+        """Draw the entities in the FOV straight from the column store."""
+        size = columns.size
+        x, y = columns.x[:size], columns.y[:size]
+        rows = np.flatnonzero(columns.in_use[:size] & self.visible[x, y])
+        rows = rows[np.argsort(columns.render_order[rows], kind="stable")]
+        # Only the last entity drawn on each tile shows, so drop the others
+        # rather than rely on the order of a repeated index assignment.
+        tile = x[rows] * self.height + y[rows]
+        _, last = np.unique(tile[::-1], return_index=True)
+        rows = rows[::-1][last]
+        console.ch[x[rows], y[rows]] = columns.char[rows]
+        console.fg[x[rows], y[rows]] = columns.color[rows]
+
+
+_floor_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_floor_executor() -> ProcessPoolExecutor:
+    """Return the worker process that generates floors in the background."""
+    global _floor_executor
+    if _floor_executor is None:
+        # Spawn rather than fork, the game process may be running threads.
+        _floor_executor = ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _floor_executor
+
+
+def zone_generator(zone_generators: Dict[int, str], floor: int) -> str:
+    """Return the name of the generator of the zone `floor` belongs to,
+    given the first floor of each zone in order."""
+    name = next(iter(zone_generators.values()))
+    for first_floor, zone_name in zone_generators.items():
+        if first_floor > floor:
+            break
+        name = zone_name
+    return name
+
 
 class GameWorld:
     """
-    Holds the settings for the GameMap, and generates new maps when moving down
-    the stairs.
+    Holds the settings for the GameMap, generates new maps when moving down
+    the stairs and keeps the floors visited so far.
+
+    Only the `max_resident_floors` most recently visited floors are kept in
+    memory. Older ones are packed in the save format and moved to a spill
+    file on disk, then restored from it when the player returns.
+
+    If `prefetch` is True then each next floor is generated in a worker
+    process while the current one is being played.
+
+    `zone_generators` maps the first floor of each zone to the name of the
+    generator in `procgen.GENERATORS` used for its floors.
+
+    Floors found in `floor_pack` are loaded from it instead of generated.
+    They are the same floors, the pack only saves the time to make them.
     """
 
     def __init__(
@@ -114,7 +399,11 @@ class GameWorld:
             max_rooms: int,
             room_min_size: int,
             room_max_size: int,
-            current_floor: int = 0
+            current_floor: int = 0,
+            max_resident_floors: int = 3,
+            prefetch: bool = True,
+            zone_generators: Optional[Dict[int, str]] = None,
+            floor_pack: Optional[FloorPack] = None,
     ):
         self.engine = engine
 
@@ -128,16 +417,238 @@ class GameWorld:
 
         self.current_floor = current_floor
 
-    def generate_floor(self) -> None:
-        from procgen import generate_dungeon
+        self.zone_generators = dict(sorted(
+                (zone_generators or {1: "rooms"}).items()))
+
+        self.max_resident_floors = max(1, max_resident_floors)
+        # Visited floors held in memory, least recently entered first.
+        self.floors: OrderedDict[int, GameMap] = OrderedDict()
+        # Packed copies of the resident floors other than the current one.
+        # Those floors don't change while the player is away, so the copy is
+        # made once when leaving and reused by saves and eviction.
+        self.packed_floors: Dict[int, bytes] = {}
+        # Offset and length in the spill file of each evicted floor.
+        self.spilled_floors: Dict[int, Tuple[int, int]] = {}
+        self.spill_file: Optional[IO[bytes]] = None
+
+        if floor_pack is not None and not floor_pack.matches(self):
+            raise ValueError(
+                    f"{floor_pack.filename} was made with other settings.")
+        self.floor_pack = floor_pack
+
+        self.prefetch = prefetch
+        # The floor number and plan of the floor being generated ahead.
+        self.pending_floor: Optional[Tuple[int, Future[FloorPlan]]] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        # Don't save the floor being generated ahead or the spill file, the
+        # spilled floors are saved packed instead.
+        state["pending_floor"] = None
+        state["spill_file"] = None
+        state["packed_floors"] = {
+            floor: self.get_packed_floor(floor)
+            for floor in (*self.packed_floors, *self.spilled_floors)
+        }
+        state["spilled_floors"] = {}
+        return state
 
-        self.current_floor += 1
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        # Spill the floors which were spilled when saved again.
+        for floor in list(self.packed_floors):
+            if floor not in self.floors:
+                self.spill_floor(floor, self.packed_floors.pop(floor))
 
-        self.engine.game_map = generate_dungeon(
-                max_rooms=self.max_rooms,
-                room_min_size=self.room_min_size,
-                room_max_size=self.room_max_size,
-                map_width=self.map_width,
-                map_height=self.map_height,
-                engine=self.engine,
+    @property
+    def visited_floors(self) -> List[int]:
+        return sorted({*self.floors, *self.spilled_floors})
+
+    @property
+    def generator_settings(self) -> Dict[str, int]:
+        """Return the settings passed to the floor generators."""
+        return {
+            "max_rooms": self.max_rooms,
+            "room_min_size": self.room_min_size,
+            "room_max_size": self.room_max_size,
+            "map_width": self.map_width,
+            "map_height": self.map_height,
+        }
+
+    def floor_plan_kwargs(self, floor: int) -> Dict[str, int]:
+        """Return the keyword arguments of the floor generator for a
+        floor."""
+        return {
+            **self.generator_settings,
+            "floor": floor,
+            "seed": self.engine.seed,
+        }
+
+    def get_generator(self, floor: int) -> Callable[..., FloorPlan]:
+        """Return the generator of the zone a floor belongs to."""
+        from procgen import GENERATORS
+
+        return GENERATORS[zone_generator(self.zone_generators, floor)]
+
+    def get_pack_plan(self, floor: int) -> Optional[FloorPlan]:
+        """Return the plan of a floor from the floor pack, if it has it."""
+        if self.floor_pack is None:
+            return None
+        return self.floor_pack.get_plan(
+                self.engine.seed, floor,
+                zone_generator(self.zone_generators, floor),
         )
+
+    def prefetch_next_floor(self) -> None:
+        """Start generating the floor below the current one."""
+        floor = self.current_floor + 1
+        if not self.prefetch or floor in self.visited_floors:
+            return
+        if self.floor_pack is not None and self.floor_pack.has_floor(
+                self.engine.seed, floor,
+                zone_generator(self.zone_generators, floor)):
+            return
+        try:
+            future = get_floor_executor().submit(
+                    self.get_generator(floor), **self.floor_plan_kwargs(floor))
+        except RuntimeError:  # The worker is gone, generate on demand.
+            return
+        self.pending_floor = (floor, future)
+
+    def get_floor_plan(self, floor: int) -> FloorPlan:
+        """Return the plan of a floor from the floor pack, or from the worker
+        if it has finished, otherwise generated here."""
+        plan = self.get_pack_plan(floor)
+        if plan is not None:
+            return plan
+        pending, self.pending_floor = self.pending_floor, None
+        if pending:
+            pending_floor, future = pending
+            if pending_floor == floor and future.done():
+                try:
+                    return future.result()
+                except Exception:
+                    pass  # Generate it here instead.
+            future.cancel()
+        return self.get_generator(floor)(**self.floor_plan_kwargs(floor))
+
+    def get_packed_floor(self, floor: int) -> bytes:
+        """Return a visited floor other than the current one, packed."""
+        if floor in self.packed_floors:
+            return self.packed_floors[floor]
+        assert self.spill_file is not None
+        offset, length = self.spilled_floors[floor]
+        self.spill_file.seek(offset)
+        return self.spill_file.read(length)
+
+    def spill_floor(self, floor: int, data: bytes) -> None:
+        """Append a packed floor to the spill file.
+
+        Space of floors restored from the file is not reused, the file is
+        deleted when it is closed.
+        """
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile(prefix="automaton-")
+        self.spill_file.seek(0, os.SEEK_END)
+        self.spilled_floors[floor] = (self.spill_file.tell(), len(data))
+        self.spill_file.write(data)
+
+    def evict_floors(self) -> None:
+        """Spill the least recently entered floors that don't fit."""
+        while len(self.floors) > self.max_resident_floors:
+            floor = next(iter(self.floors))
+            assert floor != self.current_floor
+            del self.floors[floor]
+            self.spill_floor(floor, self.packed_floors.pop(floor))
+
+    def load_floor(self, floor: int) -> Optional[GameMap]:
+        """Return a visited floor, restoring it from the spill file if needed.
+
+        Returns None if the floor hasn't been visited.
+        """
+        from savefile import unpack_game_map
+
+        game_map = self.floors.get(floor)
+        if game_map is None and floor in self.spilled_floors:
+            game_map = unpack_game_map(
+                    self.engine, self.get_packed_floor(floor))
+            del self.spilled_floors[floor]
+        # The floor is about to be played, so the packed copy goes stale.
+        self.packed_floors.pop(floor, None)
+        return game_map
+
+    def get_followers(self, game_map: GameMap) -> List[Actor]:
+        """Return the player's allies next to the player, who go along when
+        the player takes the stairs."""
+        player = self.engine.player
+        return [
+            actor for actor in game_map.get_actors_within(
+                    player.x, player.y, 1)
+            if actor is not player and actor.ai is not None
+            and actor.group == player.group
+        ]
+
+    def place_followers(
+            self, followers: List[Actor], game_map: GameMap
+    ) -> None:
+        """Place `followers` on the free tiles nearest the player on
+        `game_map`. Those that don't fit within FOLLOWER_RADIUS stay
+        behind."""
+        player = self.engine.player
+        free = game_map.get_free_tiles_near(
+                player.x, player.y, FOLLOWER_RADIUS)
+        for follower, (x, y) in zip(followers, free):
+            follower.place(x, y, game_map)
+            if follower.ai is not None:
+                follower.ai.path = []  # Paths of the old floor.
+
+    def enter_floor(self, floor: int) -> None:
+        """Move the player to `floor`, generating it on the first visit.
+
+        On a visited floor the player arrives on the up stairs when going
+        down and on the down stairs when going up, or on the nearest free
+        tile if something stands on them. Allies next to the player follow
+        them.
+        """
+        from procgen import build_game_map
+        from savefile import pack_game_map
+
+        previous_floor = self.current_floor
+        previous_map = self.floors.get(previous_floor)
+        followers = []
+        if previous_map is not None:
+            followers = self.get_followers(previous_map)
+
+        game_map = self.load_floor(floor)
+        if game_map is None:
+            game_map = build_game_map(self.get_floor_plan(floor), self.engine)
+        else:
+            if floor > previous_floor and game_map.upstairs_location:
+                x, y = game_map.upstairs_location
+            else:
+                x, y = game_map.downstairs_location
+            if game_map.get_blocking_entity_at_location(x, y):
+                free = (
+                    game_map.get_free_tiles_near(x, y, FOLLOWER_RADIUS)
+                    or game_map.get_free_tiles_near(
+                            x, y, max(game_map.width, game_map.height))
+                )
+                if free:
+                    x, y = free[0]
+            self.engine.player.place(x, y, game_map)
+        self.place_followers(followers, game_map)
+
+        if previous_map is not None:
+            # The player has left it, so pack what remains.
+            self.packed_floors[previous_floor] = pack_game_map(previous_map)
+
+        self.current_floor = floor
+        self.engine.game_map = game_map
+        self.floors[floor] = game_map
+        self.floors.move_to_end(floor)
+        self.evict_floors()
+        self.prefetch_next_floor()
+
+    def generate_floor(self) -> None:
+        """Go down to the next floor."""
+        self.enter_floor(self.current_floor + 1)
@@ -0,0 +1,161 @@
+"""Run game sessions without a window, for benchmarks and simulations."""
+from __future__ import annotations
+
+import random
+import time
+from typing import Callable, Dict, Optional, TYPE_CHECKING
+
+import tcod
+
+import actions
+from entity import Item
+import input_handlers
+import setup_game
+
+if TYPE_CHECKING:
+    from actions import Action
+    from engine import Engine
+
+Policy = Callable[["Engine"], "Action"]
+"""Picks the players next action for the current game state."""
+
+PolicyFactory = Callable[[random.Random], Policy]
+
+PHASES = ("player_action", "enemy_turns", "update_fov", "render")
+
+DIRECTIONS = [
+    (-1, -1), (0, -1), (1, -1),
+    (-1, 0), (1, 0),
+    (-1, 1), (0, 1), (1, 1),
+]
+
+
+def random_policy(rng: random.Random) -> Policy:
+    """Wander in random directions, picking up anything underfoot and taking
+    any stairs walked onto."""
+    def policy(engine: Engine) -> Action:
+        player = engine.player
+        game_map = engine.game_map
+        if (player.x, player.y) == game_map.downstairs_location:
+            return actions.TakeStairsAction(player)
+        for entity in game_map.get_entities_at_location(player.x, player.y):
+            if isinstance(entity, Item):
+                return actions.PickupAction(player)
+        return actions.BumpAction(player, *rng.choice(DIRECTIONS))
+
+    return policy
+
+
+def descend_policy(rng: random.Random) -> Policy:
+    """Head straight for the stairs on every floor, fighting anything in the
+    way."""
+    wander = random_policy(rng)
+
+    def policy(engine: Engine) -> Action:
+        player = engine.player
+        game_map = engine.game_map
+        if (player.x, player.y) == game_map.downstairs_location:
+            return actions.TakeStairsAction(player)
+        distance = game_map.get_distance_map(*game_map.downstairs_location)
+        path = tcod.path.hillclimb2d(distance, (player.x, player.y), True, True)
+        if len(path) < 2:
+            return wander(engine)  # No way to the stairs.
+        dest_x, dest_y = path[1].tolist()
+        return actions.BumpAction(player, dest_x - player.x, dest_y - player.y)
+
+    return policy
+
+
+POLICIES: Dict[str, PolicyFactory] = {
+    "random": random_policy,
+    "descend": descend_policy,
+}
+
+
+class SessionStats:
+    """Measurements from a single headless session."""
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        self.turns = 0
+        self.elapsed = 0.0
+        self.phase_times: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.floor = 0
+        self.player_alive = True
+        self.engine: Optional[Engine] = None  # The final game state.
+
+    @property
+    def turns_per_second(self) -> float:
+        return self.turns / self.elapsed if self.elapsed else 0.0
+
+
+def run_session(
+        seed: int,
+        turns: int,
+        policy_factory: PolicyFactory = random_policy,
+        render: bool = True,
+) -> SessionStats:
+    """Play a new game for up to `turns` turns and time each phase of the
+    game loop.
+
+    The session ends early if the player dies.
+    """
+    stats = SessionStats(seed)
+    engine = setup_game.new_game(seed)
+    handler = input_handlers.MainGameEventHandler(engine)
+    rng = random.Random(seed)  # Separate from the games own rolls.
+    policy = policy_factory(rng)
+    console = tcod.console.Console(80, 50, order="F")
+
+    # Time the phases run inside EventHandler.handle_action by wrapping them
+    # on this engine instance.
+    def timed(name: str, func: Callable[[], None]) -> Callable[[], None]:
+        def wrapper() -> None:
+            start = time.perf_counter()
+            func()
+            stats.phase_times[name] += time.perf_counter() - start
+        return wrapper
+
+    engine.handle_enemy_turns = timed(  # type: ignore
+            "enemy_turns", engine.handle_enemy_turns)
+    engine.update_fov = timed("update_fov", engine.update_fov)  # type: ignore
+
+    attempts_left = turns * 10  # Give up on policies stuck against walls.
+    session_start = time.perf_counter()
+    while stats.turns < turns and attempts_left > 0:
+        attempts_left -= 1
+        inner_time = stats.phase_times["enemy_turns"] + stats.phase_times[
+            "update_fov"]
+        start = time.perf_counter()
+        advanced = handler.handle_action(policy(engine))
+        stats.phase_times["player_action"] += (
+            time.perf_counter() - start
+            - (stats.phase_times["enemy_turns"]
+               + stats.phase_times["update_fov"] - inner_time)
+        )
+
+        if render:
+            start = time.perf_counter()
+            handler.on_render(console)
+            stats.phase_times["render"] += time.perf_counter() - start
+
+        if not advanced:
+            continue
+        stats.turns += 1
+        if not engine.player.is_alive:
+            stats.player_alive = False
+            break
+        if engine.player.level.requires_level_up:
+            choice = rng.randrange(3)
+            if choice == 0:
+                engine.player.level.increase_max_hp()
+            elif choice == 1:
+                engine.player.level.increase_power()
+            else:
+                engine.player.level.increase_defense()
+    stats.elapsed = time.perf_counter() - session_start
+    stats.floor = engine.game_world.current_floor
+
+    del engine.handle_enemy_turns, engine.update_fov  # Remove the wrappers.
+    stats.engine = engine
+    return stats
@@ -13,7 +13,9 @@ from actions import (
         PickupAction
 )
 import color
+from combat_odds import damage_odds
 import exceptions
+import render_functions
 
 if TYPE_CHECKING:
     from engine import Engine
@@ -210,7 +212,7 @@ class CharacterScreenEventHandler(AskUserEventHandler):
 
         console.draw_frame(
             x=x, y=y,
-            width=width, height=9,
+            width=width, height=10,
             title=self.TITLE,
             clear=True,
             fg=(255, 255, 255),
@@ -248,6 +250,16 @@ class CharacterScreenEventHandler(AskUserEventHandler):
                         f"{self.engine.player.fighter.dice_sides} + "
                         f"{self.engine.player.fighter.power}")
         )
+        # Before the target's avoidance and defense.
+        attack = damage_odds(
+                self.engine.player.fighter.dice_count,
+                self.engine.player.fighter.dice_sides,
+                self.engine.player.fighter.power, 0, 0,
+        )
+        console.print(
+                x=x+1, y=y+8,
+                string=f"Average damage: {attack.expected_damage:.1f}"
+        )
 
 
 # TODO: Allow avoidance on level up / Rework level up
@@ -469,6 +481,11 @@ class SelectIndexHandler(AskUserEventHandler):
 class LookHandler(SelectIndexHandler):
     """Lets the player look around using the keyboard."""
 
+    def on_render(self, console: tcod.Console) -> None:
+        """Show the odds of fighting the actor under the cursor."""
+        super().on_render(console)
+        render_functions.render_combat_odds(console, 0, 43, self.engine)
+
     def on_index_selected(self, x: int, y: int) -> MainGameEventHandler:
         """Return to main handler."""
         self.engine.event_handler = MainGameEventHandler(self.engine)
@@ -532,8 +549,9 @@ class MainGameEventHandler(EventHandler):
 
         player = self.engine.player
 
-        if key == tcod.event.KeySym.PERIOD and modifier & (
-                tcod.event.Modifier.LSHIFT | tcod.event.Modifier.RSHIFT
+        if key in (tcod.event.KeySym.PERIOD, tcod.event.KeySym.COMMA) and (
+                modifier & (
+                    tcod.event.Modifier.LSHIFT | tcod.event.Modifier.RSHIFT)
         ):
             return actions.TakeStairsAction(player)
 
@@ -1,14 +1,23 @@
 #!/usr/bin/env python3
+import os
 import traceback
 
 import tcod
 
+from autosave import Autosaver
 import color
 import exceptions
+from floor_pack import FloorPack
 import input_handlers
+from profiling import profiler
 import setup_game
 
 
+SAVE_FILENAME = "savegame.sav"
+
+AUTOSAVE_INTERVAL = 50  # Turns between autosaves.
+
+
 def save_game(handler: input_handlers.BaseEventHandler, filename: str) -> None:
     """If the current event handler has an active engine then save it."""
     if isinstance(handler, input_handlers.EventHandler):
@@ -16,6 +25,15 @@ def save_game(handler: input_handlers.BaseEventHandler, filename: str) -> None:
         print("Game saved.")
 
 
+def wait_for_autosave(autosaver: Autosaver) -> None:
+    """Wait for an autosave in progress. A failed autosave is only reported,
+    so it can't stop the game being saved on quit."""
+    try:
+        autosaver.wait()
+    except Exception:
+        traceback.print_exc()
+
+
 def toggle_fullscreen(context: tcod.context.Context) -> None:
     """Toggle a context window between fullscreen and windowed modes."""
     window = context.sdl_window
@@ -31,6 +49,11 @@ def main() -> None:
     screen_width = 80
     screen_height = 50
 
+    # Set AUTOMATON_PROFILE to a filename to time the game loop, F3 shows the
+    # timings in game and they are written to the file on exit.
+    profile_filename = os.environ.get("AUTOMATON_PROFILE")
+    profiler.enabled = bool(profile_filename)
+
     tileset = tcod.tileset.load_truetype_font("QuinqueFive.ttf", 20, 20)
     """ Orignal TCOD tutorial tileset
     tileset = tcod.tileset.load_tilesheet(
@@ -38,7 +61,15 @@ def main() -> None:
     )
     """
 
-    handler: input_handlers.BaseEventHandler = setup_game.MainMenu()
+    # Set AUTOMATON_FLOOR_PACK to a pack made by floor_pack.py to start new
+    # games on its pre-generated floors.
+    floor_pack = None
+    floor_pack_filename = os.environ.get("AUTOMATON_FLOOR_PACK")
+    if floor_pack_filename:
+        floor_pack = FloorPack(floor_pack_filename)
+
+    handler: input_handlers.BaseEventHandler = setup_game.MainMenu(floor_pack)
+    autosaver = Autosaver(SAVE_FILENAME, interval=AUTOSAVE_INTERVAL)
 
     with tcod.context.new_terminal(
         screen_width,
@@ -61,8 +92,14 @@ def main() -> None:
                         if (isinstance(event, tcod.event.KeyDown) and
                                 event.sym == tcod.event.KeySym.F11):
                             toggle_fullscreen(context)
+                        elif (isinstance(event, tcod.event.KeyDown) and
+                                event.sym == tcod.event.KeySym.F3 and
+                                profiler.enabled):
+                            profiler.show_overlay = not profiler.show_overlay
                         else:
                             handler = handler.handle_events(event)
+                    if isinstance(handler, input_handlers.EventHandler):
+                        autosaver.maybe_save(handler.engine)
                 except Exception:  # Handle exceptions in game
                     traceback.print_exc()  # Print error to stderr
                     # Then print error to message log
@@ -71,13 +108,23 @@ def main() -> None:
                                 traceback.format_exc(), color.error
                         )
         except exceptions.QuitWithoutSaving:
+            # Don't let an autosave still being written restore the save.
+            wait_for_autosave(autosaver)
+            if os.path.exists(SAVE_FILENAME):
+                os.remove(SAVE_FILENAME)
             raise
         except SystemExit:  # Save and quit
-            save_game(handler, "savegame.sav")
+            wait_for_autosave(autosaver)
+            save_game(handler, SAVE_FILENAME)
             raise
         except BaseException:  # Save on any other unexpected exception.
-            save_game(handler, "savegame.sav")
+            wait_for_autosave(autosaver)
+            save_game(handler, SAVE_FILENAME)
             raise
+        finally:
+            autosaver.shutdown()
+            if profile_filename:
+                profiler.export_json(profile_filename)
 
 
 if __name__ == "__main__":
@@ -4,6 +4,7 @@ import textwrap
 import tcod
 
 import color
+from profiling import profiled
 
 
 class Message:
@@ -38,6 +39,7 @@ class MessageLog:
         else:
             self.messages.append(Message(text, fg))
 
+    @profiled("message_log.render")
     def render(
             self, console: tcod.Console, x: int, y: int, width: int,
             height: int,
@@ -1,18 +1,23 @@
 from __future__ import annotations
 
 import random
-from typing import Dict, Iterator, List, Tuple, TYPE_CHECKING
+import time
+from typing import (
+        Callable, Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+)
 
+import numpy as np  # type: ignore
 import tcod
 
 import entity_factories
+from entity import Entity
 from game_map import GameMap
+from profiling import profiler
 import tile_types
 
 
 if TYPE_CHECKING:
     from engine import Engine
-    from entity import Entity
 
 max_items_by_floor = [
     (1, 1),
@@ -40,6 +45,17 @@ enemy_chances: Dict[int, List[Tuple[Entity, int]]] = {
 }
 
 
+# The name of every prototype in entity_factories, so that spawns can be
+# described as plain data.
+PROTOTYPES: Dict[str, Entity] = {
+    name: entity for name, entity in vars(entity_factories).items()
+    if isinstance(entity, Entity)
+}
+PROTOTYPE_NAMES: Dict[Entity, str] = {
+    entity: name for name, entity in PROTOTYPES.items()
+}
+
+
 def get_max_value_for_floor(
         weighted_chances_by_floor: List[Tuple[int, int]], floor: int
 ) -> int:
@@ -54,30 +70,70 @@ def get_max_value_for_floor(
     return current_value
 
 
-def get_entities_at_random(
-    weighted_chances_by_floor: Dict[int, List[Tuple[Entity, int]]],
-    number_of_entities: int, floor: int,
-) -> List[Entity]:
-    entity_weighted_chances = {}
-
-    for key, values, in weighted_chances_by_floor.items():
-        if key > floor:
-            break
-        else:
-            for value in values:
-                entity = value[0]
-                weighted_chance = value[1]
-
-                entity_weighted_chances[entity] = weighted_chance
+class SpawnTable:
+    """Weighted chances of entities by floor, and the most to spawn in one
+    room, compiled once so that lookups don't depend on the table size.
 
-    entities = list(entity_weighted_chances.keys())
-    entity_weighted_chance_values = list(entity_weighted_chances.values())
-
-    chosen_entities = random.choices(
-        entities, weights=entity_weighted_chance_values, k=number_of_entities
-    )
+    `weighted_chances_by_floor` maps a first floor to the chances taking
+    effect from it, which replace earlier chances for the same entity.
+    """
 
-    return chosen_entities
+    def __init__(
+            self,
+            weighted_chances_by_floor: Dict[int, List[Tuple[Entity, int]]],
+            max_by_floor: List[Tuple[int, int]],
+    ):
+        # Floors from the last entry of either table on are all the same.
+        last_floor = max(
+                max(weighted_chances_by_floor, default=0),
+                max((floor for floor, _ in max_by_floor), default=0),
+        )
+        weights: Dict[Entity, int] = {}
+        rows = []
+        for floor in range(last_floor + 1):
+            for entity, weighted_chance in weighted_chances_by_floor.get(
+                    floor, []):
+                weights[entity] = weighted_chance
+            rows.append(dict(weights))
+        self.entities: List[Entity] = list(weights)
+        # Row `floor` holds the cumulative weights of `entities` there.
+        self.cumulative = np.cumsum(
+            [[row.get(entity, 0) for entity in self.entities] for row in rows],
+            axis=1,
+        ).reshape(len(rows), len(self.entities))
+        self.max_counts = np.array([
+            get_max_value_for_floor(max_by_floor, floor)
+            for floor in range(last_floor + 1)
+        ])
+
+    def floor_index(self, floor: int) -> int:
+        return min(max(0, floor), len(self.max_counts) - 1)
+
+    def sample(
+            self, floor: int, rooms: int, rng: np.random.Generator
+    ) -> List[List[Entity]]:
+        """Return the entities to spawn in each of `rooms` rooms."""
+        index = self.floor_index(floor)
+        counts = rng.integers(0, self.max_counts[index] + 1, rooms)
+        cumulative = self.cumulative[index]
+        if not len(cumulative) or cumulative[-1] == 0:
+            return [[] for _ in range(rooms)]
+        # Every pick for the floor at once, as random.choices would make
+        # them one at a time.
+        picks = np.searchsorted(
+                cumulative, rng.random(counts.sum()) * cumulative[-1],
+                side="right",
+        ).tolist()
+        entities = self.entities
+        ends = np.cumsum(counts).tolist()
+        return [
+            [entities[i] for i in picks[end - count:end]]
+            for count, end in zip(counts.tolist(), ends)
+        ]
+
+
+monster_table = SpawnTable(enemy_chances, max_monsters_by_floor)
+item_table = SpawnTable(item_chances, max_items_by_floor)
 
 
 class RectangularRoom:
@@ -99,6 +155,11 @@ class RectangularRoom:
         """Return the inner area of this room as a 2D array index."""
         return slice(self.x1 + 1, self.x2), slice(self.y1 + 1, self.y2)
 
+    @property
+    def outer(self) -> Tuple[slice, slice]:
+        """Return this room including its walls as a 2D array index."""
+        return slice(self.x1, self.x2 + 1), slice(self.y1, self.y2 + 1)
+
     def intersects(self, other: RectangularRoom) -> bool:
         """Return True if this room overlaps with another RectangularRoom."""
         return (
@@ -109,49 +170,176 @@ class RectangularRoom:
         )
 
 
-def place_entities(
-        room: RectangularRoom, dungeon: GameMap, floor_number: int
-) -> None:
-    number_of_monsters = random.randint(
-            0, get_max_value_for_floor(max_monsters_by_floor, floor_number)
-    )
-    number_of_items = random.randint(
-            0, get_max_value_for_floor(max_items_by_floor, floor_number)
-    )
+class FloorPlan:
+    """The layout of a floor and the entities to spawn on it.
 
-    monsters: List[Entity] = get_entities_at_random(
-        enemy_chances, number_of_monsters, floor_number
-    )
-    items: List[Entity] = get_entities_at_random(
-        item_chances, number_of_items, floor_number
-    )
+    A plan holds no references to an Engine, so it can be generated in
+    another process. `build_game_map` turns it into a playable GameMap.
+    """
+
+    def __init__(self, width: int, height: int, floor: int):
+        self.width, self.height = width, height
+        self.floor = floor
+        # Tile ids, see tile_types.TILES.
+        self.tiles = np.full(
+                (width, height), fill_value=tile_types.wall, dtype=np.uint8,
+                order="F",
+        )
+        self.player_start = (0, 0)
+        self.downstairs_location = (0, 0)
+        self.upstairs_location: Optional[Tuple[int, int]] = None
+        # Prototype name and location of each entity to spawn, in order.
+        self.spawns: List[Tuple[str, int, int]] = []
+        # Seconds spent in each stage of generating this plan.
+        self.timings: Dict[str, float] = {}
+        # Tiles covered by a room or its walls, and tiles taken by a spawn
+        # or the player.
+        self.room_mask = np.zeros((width, height), dtype=bool, order="F")
+        self.occupied = np.zeros((width, height), dtype=bool, order="F")
 
-    for entity in monsters + items:
-        x = random.randint(room.x1 + 1, room.x2 - 1)
-        y = random.randint(room.y1 + 1, room.y2 - 1)
+    def room_fits(self, room: RectangularRoom) -> bool:
+        """Return True if `room` doesn't intersect any room added so far."""
+        return not self.room_mask[room.outer].any()
 
-        if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
-            entity.spawn(dungeon, x, y)
+    def add_room(self, room: RectangularRoom) -> None:
+        self.room_mask[room.outer] = True
+        self.tiles[room.inner] = tile_types.floor
 
+    def add_spawn(self, entity: Entity, x: int, y: int) -> None:
+        self.spawns.append((PROTOTYPE_NAMES[entity], x, y))
+        self.occupied[x, y] = True
 
-def tunnel_between(
+
+def floor_rng(seed: int, floor: int) -> random.Random:
+    """Return the random generator used to lay out a floor of a run.
+
+    Each floor gets its own stream, so a floor is the same whenever and
+    wherever it is generated.
+    """
+    return random.Random(f"{seed}:{floor}")
+
+
+def place_entities(
+        rooms: List[RectangularRoom], plan: FloorPlan, floor_number: int,
+        rng: random.Random,
+) -> None:
+    """Spawn monsters and items in every room of a floor."""
+    batch_rng = np.random.default_rng(rng.getrandbits(64))
+    monsters = monster_table.sample(floor_number, len(rooms), batch_rng)
+    items = item_table.sample(floor_number, len(rooms), batch_rng)
+
+    for room, room_monsters, room_items in zip(rooms, monsters, items):
+        entities = room_monsters + room_items
+        if not entities:
+            continue
+        # Draw distinct free floor tiles of the room all at once, rather
+        # than trying random tiles and dropping the ones already taken.
+        inner_x, inner_y = room.inner
+        walkable = tile_types.TILES["walkable"][plan.tiles[room.inner]]
+        free_x, free_y = np.nonzero(walkable & ~plan.occupied[room.inner])
+        picks = rng.sample(
+                range(len(free_x)), min(len(entities), len(free_x)))
+        for entity, i in zip(entities, picks):
+            plan.add_spawn(
+                    entity,
+                    inner_x.start + int(free_x[i]),
+                    inner_y.start + int(free_y[i]),
+            )
+
+
+def line_between(
         start: Tuple[int, int], end: Tuple[int, int]
-) -> Iterator[Tuple[int, int]]:
-    """Return an L-shaped tunnel between these two points."""
+) -> Tuple[slice, slice]:
+    """Return a horizontal or vertical line, ends included, as a 2D array
+    index."""
+    (x1, y1), (x2, y2) = start, end
+    return (
+        slice(min(x1, x2), max(x1, x2) + 1),
+        slice(min(y1, y2), max(y1, y2) + 1),
+    )
+
+
+def tunnel_between(
+        start: Tuple[int, int], end: Tuple[int, int], rng: random.Random
+) -> List[Tuple[slice, slice]]:
+    """Return an L-shaped tunnel between these two points, as one 2D array
+    index for each leg."""
     x1, y1 = start
     x2, y2 = end
-    if random.random() < 0.5:  # 50% chance
+    if rng.random() < 0.5:  # 50% chance
         # move horizontally, then verically.
         corner_x, corner_y = x2, y1
     else:
         # move vertically, then horizontally
         corner_x, corner_y = x1, y2
 
-    # generate the coordinates for this tunnel
-    for x, y in tcod.los.bresenham((x1, y1), (corner_x, corner_y)).tolist():
-        yield x, y
-    for x, y in tcod.los.bresenham((corner_x, corner_y), (x2, y2)).tolist():
-        yield x, y
+    return [
+        line_between((x1, y1), (corner_x, corner_y)),
+        line_between((corner_x, corner_y), (x2, y2)),
+    ]
+
+
+UNREACHABLE = np.iinfo(np.int32).max
+
+
+def flood_fill(walkable: np.ndarray, start: Tuple[int, int]) -> np.ndarray:
+    """Return the walking distance of every tile from `start`, UNREACHABLE
+    where it can't be reached."""
+    distance = tcod.path.maxarray(walkable.shape, dtype=np.int32, order="F")
+    distance[start] = 0
+    tcod.path.dijkstra2d(
+            distance, walkable.astype(np.int8), 1, 1, out=distance)
+    return distance
+
+
+def find_unreachable(
+        plan: FloorPlan, targets: Sequence[Tuple[int, int]]
+) -> List[Tuple[int, int]]:
+    """Flood fill the floor from the player's start and return the targets
+    and stairs which can't be walked to."""
+    distance = flood_fill(
+            tile_types.TILES["walkable"][plan.tiles], plan.player_start)
+    unreachable = distance == UNREACHABLE
+    targets = [*targets, plan.downstairs_location]
+    return [target for target in targets if unreachable[target]]
+
+
+def finish_plan(
+        plan: FloorPlan,
+        rooms: List[RectangularRoom],
+        targets: Sequence[Tuple[int, int]],
+        rng: random.Random,
+        seed: int,
+) -> None:
+    """Spawn entities in `rooms`, add the stairs up and check that the
+    `targets` and the stairs down can be reached from the player's start.
+
+    Shared by every generator once the layout of a floor is done.
+    """
+    start = time.perf_counter()
+    place_entities(rooms, plan, plan.floor, rng)
+    plan.timings["spawns"] = time.perf_counter() - start
+
+    if plan.floor > 1:
+        # Stairs back up to the previous floor where the player arrives.
+        plan.tiles[plan.player_start] = tile_types.up_stairs
+        plan.upstairs_location = plan.player_start
+
+    start = time.perf_counter()
+    unreachable = find_unreachable(plan, targets)
+    plan.timings["connectivity"] = time.perf_counter() - start
+    if unreachable:
+        raise RuntimeError(
+                f"Floor {plan.floor} of seed {seed} has unreachable tiles:"
+                f" {unreachable}")
+
+    # Spawn Test Entities Here
+    player_x, player_y = plan.player_start
+    plan.add_spawn(entity_factories.allied_dummy, player_x + 1, player_y + 1)
+    plan.add_spawn(entity_factories.capacitor, player_x - 1, player_y - 1)
+    plan.add_spawn(entity_factories.armored_plating, player_x - 1, player_y - 1)
+    plan.add_spawn(entity_factories.thrusters, player_x - 1, player_y - 1)
+    plan.add_spawn(entity_factories.servos, player_x - 1, player_y - 1)
 
 
 def generate_dungeon(
@@ -160,57 +348,295 @@ def generate_dungeon(
     room_max_size: int,
     map_width: int,
     map_height: int,
-    engine: Engine,
-) -> GameMap:
-    """Generate a new dungeon map."""
-    player = engine.player
-    dungeon = GameMap(engine, map_width, map_height, entities=[player])
+    floor: int,
+    seed: int,
+) -> FloorPlan:
+    """Generate the plan of a new dungeon floor for the run with `seed`."""
+    rng = floor_rng(seed, floor)
+    dungeon = FloorPlan(map_width, map_height, floor)
+    start = time.perf_counter()
+    corridor_seconds = 0.0
+    corridors = np.zeros((map_width, map_height), dtype=bool, order="F")
 
     rooms: List[RectangularRoom] = []
 
     center_of_last_room = (0, 0)
 
     for r in range(max_rooms):
-        room_width = random.randint(room_min_size, room_max_size)
-        room_height = random.randint(room_min_size, room_max_size)
+        room_width = rng.randint(room_min_size, room_max_size)
+        room_height = rng.randint(room_min_size, room_max_size)
 
-        x = random.randint(0, dungeon.width - room_width - 1)
-        y = random.randint(0, dungeon.height - room_height - 1)
+        x = rng.randint(0, dungeon.width - room_width - 1)
+        y = rng.randint(0, dungeon.height - room_height - 1)
 
         # "RectangularRoom" class makes rectangles easier to work with
         new_room = RectangularRoom(x, y, room_width, room_height)
 
-        # Run thorught the other rooms and see if they intersect with this one
-        if any(new_room.intersects(other_room) for other_room in rooms):
+        # Check the room against the area taken by every other room
+        if not dungeon.room_fits(new_room):
             continue  # This room intersects, so go to the next attempt
         # If there are no intersections then the room is valid
 
         # Dig out this rooms inner area
-        dungeon.tiles[new_room.inner] = tile_types.floor
+        dungeon.add_room(new_room)
 
         if len(rooms) == 0:
             # The first room, where the player starts
-            player.place(*new_room.center, dungeon)
+            dungeon.player_start = new_room.center
+            dungeon.occupied[new_room.center] = True
         else:  # All rooms after the first.
             # Dig out a tunnel between this room and the previous one.
-            for x, y in tunnel_between(rooms[-1].center, new_room.center):
-                dungeon.tiles[x, y] = tile_types.floor
+            corridor_start = time.perf_counter()
+            for leg in tunnel_between(rooms[-1].center, new_room.center, rng):
+                corridors[leg] = True
+            corridor_seconds += time.perf_counter() - corridor_start
 
             center_of_last_room = new_room.center
 
-        place_entities(new_room, dungeon, engine.game_world.current_floor)
-
         dungeon.tiles[center_of_last_room] = tile_types.down_stairs
         dungeon.downstairs_location = center_of_last_room
 
         # Finally, append the new room to the list.
         rooms.append(new_room)
 
-    # Spawn Test Entities Here
-    entity_factories.allied_dummy.spawn(dungeon, player.x + 1, player.y + 1)
-    entity_factories.capacitor.spawn(dungeon, player.x - 1, player.y - 1)
-    entity_factories.armored_plating.spawn(dungeon, player.x - 1, player.y - 1)
-    entity_factories.thrusters.spawn(dungeon, player.x - 1, player.y - 1)
-    entity_factories.servos.spawn(dungeon, player.x - 1, player.y - 1)
+    corridor_start = time.perf_counter()
+    dungeon.timings["rooms"] = corridor_start - start - corridor_seconds
+    # Dig every tunnel at once. The tunnels to each room run over the down
+    # stairs of the room before, so only the last stairs are left.
+    dungeon.tiles[corridors] = tile_types.floor
+    dungeon.tiles[dungeon.downstairs_location] = tile_types.down_stairs
+    dungeon.timings["corridors"] = (
+            corridor_seconds + time.perf_counter() - corridor_start)
+
+    finish_plan(
+            dungeon, rooms, [room.center for room in rooms], rng, seed)
+    return dungeon
+
+
+def count_block(mask: np.ndarray, radius: int = 1) -> np.ndarray:
+    """Return how many cells are set in the square block of `radius`
+    around each cell, itself included, counting cells beyond the edges as
+    set.
+
+    This is a convolution with a square kernel of ones, done as a sum over
+    rows and then over columns of the padded mask.
+    """
+    width, height = mask.shape
+    padded = np.pad(mask, radius, constant_values=True).astype(np.int8)
+    rows = padded[:width].copy()
+    for i in range(1, radius * 2 + 1):
+        rows += padded[i:i + width]
+    block = rows[:, :height].copy()
+    for i in range(1, radius * 2 + 1):
+        block += rows[:, i:i + height]
+    return block
+
+
+# Chance of each cell starting as wall, and the smoothing passes made
+# before the caves are settled. The first passes also raise pillars in
+# wide open areas.
+CAVE_WALL_CHANCE = 0.45
+CAVE_PILLAR_PASSES = 4
+CAVE_SMOOTHING_PASSES = 3
+
+
+def generate_caves(
+    max_rooms: int,
+    room_min_size: int,
+    room_max_size: int,
+    map_width: int,
+    map_height: int,
+    floor: int,
+    seed: int,
+) -> FloorPlan:
+    """Generate the plan of a cave floor grown by cellular automata.
+
+    Takes the same arguments as `generate_dungeon`. Spawns are spread over
+    a grid of squares as wide as a large room and a small one together,
+    `max_rooms` is unused.
+    """
+    rng = floor_rng(seed, floor)
+    batch_rng = np.random.default_rng(rng.getrandbits(64))
+    dungeon = FloorPlan(map_width, map_height, floor)
+    start = time.perf_counter()
+
+    wall = batch_rng.random((map_width, map_height)) < CAVE_WALL_CHANCE
+    for _ in range(CAVE_PILLAR_PASSES):
+        # A cell becomes wall when most of the 3x3 block around it is, or
+        # when there is hardly any wall in the 5x5 block.
+        wall = (count_block(wall) >= 5) | (count_block(wall, 2) <= 2)
+    for _ in range(CAVE_SMOOTHING_PASSES):
+        wall = count_block(wall) >= 5
+    wall[[0, -1], :] = wall[:, [0, -1]] = True
+    dungeon.timings["caves"] = time.perf_counter() - start
+
+    # Start in the open, so that the test spawns around the player land on
+    # floor, and keep only the cave the player starts in.
+    start = time.perf_counter()
+    open_blocks = np.argwhere(count_block(wall) == 0)
+    if not len(open_blocks):
+        raise RuntimeError(f"Floor {floor} of seed {seed} has no open cave.")
+    best: Optional[np.ndarray] = None
+    for i in batch_rng.permutation(len(open_blocks))[:10].tolist():
+        player_start = tuple(open_blocks[i].tolist())
+        if best is not None and best[player_start] != UNREACHABLE:
+            continue  # Part of a cave already tried.
+        distance = flood_fill(~wall, player_start)
+        reached = distance != UNREACHABLE
+        if best is None or reached.sum() > (best != UNREACHABLE).sum():
+            best, dungeon.player_start = distance, player_start
+        if reached.sum() * 2 > (~wall).sum():
+            break  # No other cave can be larger.
+    assert best is not None
+    reached = best != UNREACHABLE
+    dungeon.tiles[reached] = tile_types.floor
+    dungeon.occupied[dungeon.player_start] = True
+
+    # The stairs down are as far a walk as possible from the start.
+    x, y = np.unravel_index(np.where(reached, best, -1).argmax(), best.shape)
+    dungeon.downstairs_location = int(x), int(y)
+    dungeon.tiles[dungeon.downstairs_location] = tile_types.down_stairs
+    dungeon.timings["regions"] = time.perf_counter() - start
+
+    size = room_min_size + room_max_size
+    areas = [
+        RectangularRoom(x - 1, y - 1, size + 1, size + 1)
+        for x in range(0, map_width, size)
+        for y in range(0, map_height, size)
+    ]
+    finish_plan(dungeon, areas, [], rng, seed)
+    return dungeon
+
+
+def split_area(
+        x1: int, y1: int, x2: int, y2: int, min_size: int, rng: random.Random
+) -> List[Tuple[int, int, int, int]]:
+    """Split an area in two until no part can be split again, and return
+    the parts in tree order.
+
+    Areas are given as x1, y1, x2, y2 with the far edges excluded. Every
+    part is at least `min_size` across.
+    """
+    width, height = x2 - x1, y2 - y1
+    can_split_x = width >= min_size * 2
+    can_split_y = height >= min_size * 2
+    if not can_split_x and not can_split_y:
+        return [(x1, y1, x2, y2)]
+    if can_split_x and can_split_y:
+        # Cut across the longer side, or either way for a squarish area.
+        if width > height * 1.25:
+            split_x = True
+        elif height > width * 1.25:
+            split_x = False
+        else:
+            split_x = rng.random() < 0.5
+    else:
+        split_x = can_split_x
+    if split_x:
+        cut = rng.randint(x1 + min_size, x2 - min_size)
+        return (split_area(x1, y1, cut, y2, min_size, rng)
+                + split_area(cut, y1, x2, y2, min_size, rng))
+    cut = rng.randint(y1 + min_size, y2 - min_size)
+    return (split_area(x1, y1, x2, cut, min_size, rng)
+            + split_area(x1, cut, x2, y2, min_size, rng))
+
+
+def generate_bsp(
+    max_rooms: int,
+    room_min_size: int,
+    room_max_size: int,
+    map_width: int,
+    map_height: int,
+    floor: int,
+    seed: int,
+) -> FloorPlan:
+    """Generate the plan of a floor by binary space partitioning.
+
+    Takes the same arguments as `generate_dungeon`. The map is split into
+    areas with one room each, and rooms are joined back up the tree so
+    that every room is reached. The room count follows from the map size,
+    `max_rooms` is unused.
+    """
+    rng = floor_rng(seed, floor)
+    dungeon = FloorPlan(map_width, map_height, floor)
+    start = time.perf_counter()
+
+    # Every area fits the largest room, with a spare row and column as room
+    # walls are inclusive.
+    areas = split_area(0, 0, map_width, map_height, room_max_size + 2, rng)
+    dungeon.timings["partition"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rooms: List[RectangularRoom] = []
+    for x1, y1, x2, y2 in areas:
+        room_width = rng.randint(
+                room_min_size, min(room_max_size, x2 - x1 - 2))
+        room_height = rng.randint(
+                room_min_size, min(room_max_size, y2 - y1 - 2))
+        x = rng.randint(x1, x2 - room_width - 2)
+        y = rng.randint(y1, y2 - room_height - 2)
+        room = RectangularRoom(x, y, room_width, room_height)
+        dungeon.add_room(room)
+        rooms.append(room)
+    dungeon.timings["rooms"] = time.perf_counter() - start
+
+    # Rooms next to each other in tree order are close on the map. Join
+    # neighboring runs of rooms through their closest pair of rooms,
+    # doubling the run length each pass until every room is joined.
+    start = time.perf_counter()
+    corridors = np.zeros((map_width, map_height), dtype=bool, order="F")
+    centers = np.array([room.center for room in rooms])
+    span = 1
+    while span < len(rooms):
+        for left in range(0, len(rooms) - span, span * 2):
+            right = left + span
+            end = min(right + span, len(rooms))
+            gaps = np.abs(
+                    centers[left:right, None] - centers[None, right:end]
+            ).sum(axis=2)
+            i, j = np.unravel_index(gaps.argmin(), gaps.shape)
+            for leg in tunnel_between(
+                    rooms[left + i].center, rooms[right + j].center, rng):
+                corridors[leg] = True
+        span *= 2
+    dungeon.tiles[corridors] = tile_types.floor
+    dungeon.timings["corridors"] = time.perf_counter() - start
+
+    dungeon.player_start = rooms[0].center
+    dungeon.occupied[dungeon.player_start] = True
+    dungeon.downstairs_location = rooms[-1].center
+    dungeon.tiles[dungeon.downstairs_location] = tile_types.down_stairs
+
+    finish_plan(dungeon, rooms, [room.center for room in rooms], rng, seed)
+    return dungeon
+
+
+# Floor generators by name, all taking the arguments of generate_dungeon.
+# GameWorld picks one for each zone of the dungeon.
+GENERATORS: Dict[str, Callable[..., FloorPlan]] = {
+    "rooms": generate_dungeon,
+    "caves": generate_caves,
+    "bsp": generate_bsp,
+}
+
+
+def build_game_map(plan: FloorPlan, engine: Engine) -> GameMap:
+    """Create the GameMap of a floor plan, moving the player onto it."""
+    if profiler.enabled:
+        # The plan may have been made in another process, so its timings
+        # are recorded here.
+        for stage, seconds in plan.timings.items():
+            profiler.record(f"procgen.{stage}", seconds)
+    player = engine.player
+    dungeon = GameMap(engine, plan.width, plan.height, entities=[player])
+    dungeon.tiles = plan.tiles
+    dungeon.downstairs_location = plan.downstairs_location
+    dungeon.upstairs_location = plan.upstairs_location
+    player.place(*plan.player_start, dungeon)
+    dungeon.tiles_changed()
+
+    dungeon.spawn_entities(
+        (PROTOTYPES[name], x, y) for name, x, y in plan.spawns
+    )
 
     return dungeon
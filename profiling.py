@@ -0,0 +1,117 @@
+"""Opt-in timing of the game loop.
+
+Functions decorated with `profiled` and AI turns run through
+`Profiler.run_ai` are timed only while `profiler.enabled` is set, otherwise
+they cost a single attribute check.
+"""
+from __future__ import annotations
+
+from collections import deque
+import functools
+import json
+import time
+from typing import (
+        Any, Callable, Deque, Dict, Optional, Tuple, TypeVar, TYPE_CHECKING
+)
+
+import numpy as np  # type: ignore
+
+if TYPE_CHECKING:
+    from components.ai import BaseAI
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Histogram bucket edges in milliseconds, for exported timings.
+HISTOGRAM_EDGES_MS = [0.0, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0,
+                      100.0, float("inf")]
+
+
+class Profiler:
+    def __init__(self, window: int = 500):
+        self.enabled = False
+        self.show_overlay = False
+        self.window = window  # Samples kept per section.
+        self.samples: Dict[str, Deque[float]] = {}
+        self.totals: Dict[str, Tuple[int, float]] = {}  # count, seconds
+        # (name, seconds) of the slowest AI in the latest enemy turn.
+        self.slowest_ai: Optional[Tuple[str, float]] = None
+
+    def record(self, name: str, seconds: float) -> None:
+        """Add a timing sample to the named section."""
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window)
+        samples.append(seconds)
+        count, total = self.totals.get(name, (0, 0.0))
+        self.totals[name] = (count + 1, total + seconds)
+
+    def last(self, name: str) -> float:
+        """Return the latest sample of a section in seconds, or 0."""
+        samples = self.samples.get(name)
+        return samples[-1] if samples else 0.0
+
+    def start_turn(self) -> None:
+        self.slowest_ai = None
+
+    def run_ai(self, ai: BaseAI) -> None:
+        """Perform an AI's turn, timing it when profiling is enabled."""
+        if not self.enabled:
+            return ai.perform()
+        start = time.perf_counter()
+        try:
+            return ai.perform()
+        finally:
+            seconds = time.perf_counter() - start
+            self.record(f"ai.{type(ai).__name__}", seconds)
+            if self.slowest_ai is None or seconds > self.slowest_ai[1]:
+                self.slowest_ai = (ai.entity.name, seconds)
+
+    def reset(self) -> None:
+        self.samples.clear()
+        self.totals.clear()
+        self.slowest_ai = None
+
+    def summary(self) -> Dict[str, Any]:
+        """Return the rolling statistics of every section."""
+        sections = {}
+        for name, samples in sorted(self.samples.items()):
+            ms = np.array(samples) * 1000
+            count, total = self.totals[name]
+            sections[name] = {
+                "count": count,
+                "total_ms": total * 1000,
+                "window": len(ms),
+                "mean_ms": float(ms.mean()),
+                "p50_ms": float(np.percentile(ms, 50)),
+                "p95_ms": float(np.percentile(ms, 95)),
+                "max_ms": float(ms.max()),
+                "histogram": np.histogram(
+                    ms, bins=HISTOGRAM_EDGES_MS)[0].tolist(),
+            }
+        return {
+            "histogram_edges_ms": HISTOGRAM_EDGES_MS[:-1] + ["inf"],
+            "sections": sections,
+        }
+
+    def export_json(self, filename: str) -> None:
+        with open(filename, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+
+profiler = Profiler()
+
+
+def profiled(name: str) -> Callable[[F], F]:
+    """Decorate a function so its calls are timed under `name`."""
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.record(name, time.perf_counter() - start)
+        return wrapper  # type: ignore
+    return decorator
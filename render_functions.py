@@ -4,6 +4,8 @@ from typing import Tuple, TYPE_CHECKING
 
 
 import color
+from combat_odds import fighter_odds
+from profiling import profiler
 
 if TYPE_CHECKING:
     from tcod import Console
@@ -16,8 +18,7 @@ def get_names_at_location(x: int, y: int, game_map: GameMap) -> str:
         return ""
 
     names = ", ".join(
-            entity.name for entity in game_map.entities if
-            entity.x == x and entity.y == y
+            entity.name for entity in game_map.get_entities_at_location(x, y)
     )
 
     return names.capitalize()
@@ -61,3 +62,50 @@ def render_names_at_location(
     )
 
     console.print(x=x, y=y, string=names_at_mouse_location)
+
+
+def render_combat_odds(
+        console: Console, x: int, y: int, engine: Engine
+) -> None:
+    """Render the odds of one attack between the player and the actor under
+    the mouse, if one is visible there."""
+    mouse_x, mouse_y = engine.mouse_location
+    game_map = engine.game_map
+    if not game_map.in_bounds(mouse_x, mouse_y):
+        return
+    actor = game_map.get_actor_at_location(mouse_x, mouse_y)
+    if (actor is None or actor is engine.player
+            or not game_map.visible[mouse_x, mouse_y]):
+        return
+
+    player = engine.player.fighter
+    dealt = fighter_odds(player, actor.fighter)
+    taken = fighter_odds(actor.fighter, player)
+    console.print(
+            x=x, y=y,
+            string=f"Deal {dealt.expected_damage:.1f}, "
+                   f"kill {dealt.kill_chance(actor.fighter.hp):.0%}",
+    )
+    console.print(
+            x=x, y=y + 1,
+            string=f"Take {taken.expected_damage:.1f}, "
+                   f"die {taken.kill_chance(player.hp):.0%}",
+    )
+
+
+def render_profiler_overlay(console: Console, x: int, y: int) -> None:
+    """Render the latest frame and turn timings, and the slowest AI."""
+    frame_ms = profiler.last("engine.render") * 1000
+    turn_ms = (profiler.last("engine.handle_enemy_turns")
+               + profiler.last("engine.update_fov")) * 1000
+
+    console.print(x=x, y=y, string=f"Frame: {frame_ms:6.2f} ms",
+                  fg=color.white, bg=color.black)
+    console.print(x=x, y=y + 1, string=f"Turn:  {turn_ms:6.2f} ms",
+                  fg=color.white, bg=color.black)
+    if profiler.slowest_ai:
+        name, seconds = profiler.slowest_ai
+        console.print(
+                x=x, y=y + 2, string=f"AI: {name[:15]} {seconds * 1000:.2f} ms",
+                fg=color.white, bg=color.black,
+        )
@@ -0,0 +1,549 @@
+"""Read and write saved games.
+
+A save file starts with a fixed size header::
+
+    magic (8 bytes) | version (uint32) | flags (uint32)
+    | index offset (uint64) | index length (uint64)
+
+followed by data sections, each starting on a 64 byte boundary, and a JSON
+index describing them at the end of the file. Map layers (`tiles`, which
+holds tile ids, `visible` and `explored`) are stored as raw NumPy buffers
+in Fortran order, and everything else as one JSON "state" section of plain
+records. Nothing is unpickled, so loading a save never runs code from the
+file.
+
+Sections are compressed with zlib level 1 by default. Uncompressed saves
+are larger, but their map layers are memory mapped copy-on-write when
+loaded instead of being read into memory.
+
+Visited floors other than the current one are stored as "packed" sections,
+each a complete zlib compressed file in this same format made by
+`pack_game_map`. They are copied in and out as is.
+"""
+from __future__ import annotations
+
+import io
+import json
+import os
+import struct
+import zlib
+from typing import (
+        Any, BinaryIO, Dict, List, Optional, Tuple, Type, TYPE_CHECKING
+)
+
+import numpy as np  # type: ignore
+
+from actor_groups import ActorGroups
+from components.ai import BaseAI, ConfusedEnemy
+from components.consumable import Consumable
+from components.equipment import Equipment
+from components.equippable import Equippable
+from components.fighter import Fighter
+from components.inventory import Inventory
+from components.level import Level
+from engine import Engine
+from entity import Actor, Entity, Item
+from equipment_types import EquipmentType
+from game_map import GameMap, GameWorld
+from message_log import Message
+from render_order import RenderOrder
+
+if TYPE_CHECKING:
+    from message_log import MessageLog
+
+MAGIC = b"AUTOMSAV"
+VERSION = 3
+
+COMPRESSIONS = ("zlib", "none")
+
+HEADER = struct.Struct("<8sIIQQ")
+ALIGNMENT = 64
+
+MAP_LAYERS = ("tiles", "visible", "explored")
+
+# The state, map layers and packed sections of a save.
+SaveData = Tuple[Dict[str, Any], Dict[str, np.ndarray], Dict[str, bytes]]
+
+
+class SaveFormatError(Exception):
+    """Raised when a file is not a save this version can read."""
+
+
+def _subclasses(cls: Type[Any]) -> Dict[str, Type[Any]]:
+    """Return every subclass of `cls` by name, including `cls` itself."""
+    classes = {cls.__name__: cls}
+    for subclass in cls.__subclasses__():
+        classes.update(_subclasses(subclass))
+    return classes
+
+
+def _component_state(component: Any) -> Dict[str, Any]:
+    return {
+        key: value for key, value in vars(component).items()
+        if key != "parent"
+    }
+
+
+def _restore_component(cls: Type[Any], state: Dict[str, Any]) -> Any:
+    component = object.__new__(cls)
+    component.__dict__.update(state)
+    return component
+
+
+# Encoding
+
+def encode_ai(ai: Optional[BaseAI]) -> Optional[Dict[str, Any]]:
+    if ai is None:
+        return None
+    record: Dict[str, Any] = {"class": type(ai).__name__}
+    if isinstance(ai, ConfusedEnemy):
+        record["previous_ai"] = encode_ai(ai.previous_ai)
+        record["turns_remaining"] = ai.turns_remaining
+    if hasattr(ai, "path"):
+        record["path"] = list(ai.path)
+    return record
+
+
+def encode_item(item: Item) -> Dict[str, Any]:
+    record = encode_entity_base(item)
+    record["kind"] = "item"
+    if item.consumable:
+        record["consumable"] = {
+            "class": type(item.consumable).__name__,
+            "state": _component_state(item.consumable),
+        }
+    if item.equippable:
+        state = _component_state(item.equippable)
+        state["equipment_type"] = item.equippable.equipment_type.name
+        record["equippable"] = {
+            "class": type(item.equippable).__name__,
+            "state": state,
+        }
+    return record
+
+
+def encode_entity_base(entity: Entity) -> Dict[str, Any]:
+    return {
+        "name": entity.name,
+        "char": entity.char,
+        "color": entity.color,
+        "x": entity.x,
+        "y": entity.y,
+        "blocks_movement": entity.blocks_movement,
+        "render_order": entity.render_order.name,
+    }
+
+
+def encode_actor(actor: Actor) -> Dict[str, Any]:
+    record = encode_entity_base(actor)
+    fighter = actor.fighter
+    inventory_items = actor.inventory.items
+    record.update({
+        "kind": "actor",
+        "group": actor.group.name,
+        "ai": encode_ai(actor.ai),
+        "fighter": [
+            fighter.max_hp, fighter.hp, fighter.base_avoidance,
+            fighter.base_defense, fighter.base_power,
+            fighter.base_dice_count, fighter.base_dice_sides,
+        ],
+        "level": [
+            actor.level.current_level, actor.level.current_xp,
+            actor.level.level_up_base, actor.level.level_up_factor,
+            actor.level.xp_given,
+        ],
+        "inventory": {
+            "capacity": actor.inventory.capacity,
+            "items": [encode_item(item) for item in inventory_items],
+        },
+        "equipment": {
+            "max_parts": actor.equipment.max_parts,
+            # Equipped parts are always carried, so store their positions.
+            "parts": [
+                inventory_items.index(part) for part in actor.equipment.parts
+            ],
+        },
+    })
+    return record
+
+
+def encode_entity(entity: Entity) -> Dict[str, Any]:
+    if isinstance(entity, Actor):
+        return encode_actor(entity)
+    if isinstance(entity, Item):
+        return encode_item(entity)
+    record = encode_entity_base(entity)
+    record["kind"] = "entity"
+    return record
+
+
+def encode_message_log(message_log: MessageLog) -> List[Any]:
+    return [
+        [message.plain_text, message.fg, message.count]
+        for message in message_log.messages
+    ]
+
+
+def encode_game_map(
+        game_map: GameMap
+) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Return the records and layer arrays of a map."""
+    entities = list(game_map.entities)
+    record = {
+        "width": game_map.width,
+        "height": game_map.height,
+        "downstairs_location": game_map.downstairs_location,
+        "upstairs_location": game_map.upstairs_location,
+        "entities": [encode_entity(entity) for entity in entities],
+    }
+    layers = {name: getattr(game_map, name) for name in MAP_LAYERS}
+    return record, layers
+
+
+def encode_engine(engine: Engine) -> SaveData:
+    """Return the JSON compatible state of an engine, the layers of the
+    current map and the other visited floors packed.
+
+    The layers are the maps own arrays, not copies.
+    """
+    game_map_record, layers = encode_game_map(engine.game_map)
+    game_world = engine.game_world
+    rng_version, rng_internal, rng_gauss = engine.rng.getstate()
+    other_floors = [
+        floor for floor in game_world.visited_floors
+        if floor != game_world.current_floor
+    ]
+    state = {
+        "seed": engine.seed,
+        "rng": [rng_version, rng_internal, rng_gauss],
+        "turn": engine.turn,
+        "mouse_location": engine.mouse_location,
+        "player": list(engine.game_map.entities).index(engine.player),
+        "message_log": encode_message_log(engine.message_log),
+        "game_map": game_map_record,
+        "game_world": {
+            "map_width": game_world.map_width,
+            "map_height": game_world.map_height,
+            "max_rooms": game_world.max_rooms,
+            "room_min_size": game_world.room_min_size,
+            "room_max_size": game_world.room_max_size,
+            "current_floor": game_world.current_floor,
+            "max_resident_floors": game_world.max_resident_floors,
+            # JSON keys are strings, so the zones are kept as pairs.
+            "zone_generators": list(game_world.zone_generators.items()),
+        },
+        "floors": other_floors,
+    }
+    packed = {
+        f"floor.{floor}": game_world.get_packed_floor(floor)
+        for floor in other_floors
+    }
+    return state, layers, packed
+
+
+def snapshot_engine(engine: Engine) -> SaveData:
+    """Like `encode_engine`, but with copies of the map layers, so the
+    result can be written by another thread while the game continues."""
+    state, layers, packed = encode_engine(engine)
+    layers = {name: np.array(layer) for name, layer in layers.items()}
+    return state, layers, packed
+
+
+# Decoding
+
+def decode_ai(
+        record: Optional[Dict[str, Any]], actor: Actor
+) -> Optional[BaseAI]:
+    if record is None:
+        return None
+    cls = _subclasses(BaseAI)[record["class"]]
+    if cls is ConfusedEnemy:
+        ai: BaseAI = ConfusedEnemy(
+                entity=actor,
+                previous_ai=decode_ai(record["previous_ai"], actor),
+                turns_remaining=record["turns_remaining"],
+        )
+    else:
+        ai = cls(actor)
+    if "path" in record:
+        ai.path = [(x, y) for x, y in record["path"]]
+    return ai
+
+
+def decode_item(record: Dict[str, Any]) -> Item:
+    consumable = None
+    if "consumable" in record:
+        consumable = _restore_component(
+                _subclasses(Consumable)[record["consumable"]["class"]],
+                record["consumable"]["state"],
+        )
+    equippable = None
+    if "equippable" in record:
+        state = dict(record["equippable"]["state"])
+        state["equipment_type"] = EquipmentType[state["equipment_type"]]
+        equippable = _restore_component(
+                _subclasses(Equippable)[record["equippable"]["class"]], state
+        )
+    item = Item(
+            x=record["x"], y=record["y"], char=record["char"],
+            color=tuple(record["color"]), name=record["name"],
+            consumable=consumable, equippable=equippable,
+    )
+    return item
+
+
+def decode_actor(record: Dict[str, Any]) -> Actor:
+    max_hp, hp, *base_stats = record["fighter"]
+    fighter = Fighter(max_hp, *base_stats)
+    fighter._hp = hp  # Bypass the setter, dead actors are already dead.
+
+    inventory = Inventory(capacity=record["inventory"]["capacity"])
+    level = Level(*record["level"])
+    equipment = Equipment(
+            parts=[], max_parts=record["equipment"]["max_parts"])
+
+    actor = Actor(
+            x=record["x"], y=record["y"], char=record["char"],
+            color=tuple(record["color"]), name=record["name"],
+            group=ActorGroups[record["group"]], ai_cls=BaseAI,
+            equipment=equipment, fighter=fighter, inventory=inventory,
+            level=level,
+    )
+    actor.ai = decode_ai(record["ai"], actor)
+
+    for item_record in record["inventory"]["items"]:
+        item = decode_item(item_record)
+        item.parent = inventory
+        inventory.items.append(item)
+    # Equip directly, the bonuses are already included in the saved stats.
+    equipment.parts = [
+        inventory.items[index] for index in record["equipment"]["parts"]
+    ]
+    equipment.parts_changed()
+    return actor
+
+
+def decode_entity(record: Dict[str, Any]) -> Entity:
+    if record["kind"] == "actor":
+        entity: Entity = decode_actor(record)
+    elif record["kind"] == "item":
+        entity = decode_item(record)
+    else:
+        entity = Entity(
+                x=record["x"], y=record["y"], char=record["char"],
+                color=tuple(record["color"]), name=record["name"],
+        )
+    entity.blocks_movement = record["blocks_movement"]
+    entity.render_order = RenderOrder[record["render_order"]]
+    return entity
+
+
+def decode_game_map(
+        engine: Engine, record: Dict[str, Any],
+        layers: Dict[str, np.ndarray], entities: List[Entity],
+) -> GameMap:
+    game_map = GameMap(
+            engine, record["width"], record["height"], entities=entities
+    )
+    for entity in entities:
+        entity.parent = game_map
+    for name in MAP_LAYERS:
+        setattr(game_map, name, layers[name])
+    game_map.downstairs_location = tuple(record["downstairs_location"])
+    if record.get("upstairs_location"):
+        game_map.upstairs_location = tuple(record["upstairs_location"])
+    game_map.tiles_changed()
+    return game_map
+
+
+def decode_engine(
+        state: Dict[str, Any],
+        layers: Dict[str, np.ndarray],
+        packed: Dict[str, bytes],
+) -> Engine:
+    entities = [
+        decode_entity(record) for record in state["game_map"]["entities"]
+    ]
+    player = entities[state["player"]]
+    assert isinstance(player, Actor)
+
+    engine = Engine(player=player, seed=state["seed"])
+    rng_version, rng_internal, rng_gauss = state["rng"]
+    engine.rng.setstate((rng_version, tuple(rng_internal), rng_gauss))
+    engine.turn = state["turn"]
+    engine.mouse_location = tuple(state["mouse_location"])
+    for text, fg, count in state["message_log"]:
+        message = Message(text, tuple(fg))
+        message.count = count
+        engine.message_log.messages.append(message)
+
+    engine.game_map = decode_game_map(
+            engine, state["game_map"], layers, entities)
+    world_state = dict(state["game_world"])
+    world_state["zone_generators"] = {
+        floor: name for floor, name in world_state["zone_generators"]
+    }
+    engine.game_world = game_world = GameWorld(engine=engine, **world_state)
+    game_world.floors[game_world.current_floor] = engine.game_map
+    # Other floors stay packed until the player goes back to them.
+    for floor in state["floors"]:
+        game_world.spill_floor(floor, packed[f"floor.{floor}"])
+    return engine
+
+
+# Files
+
+def _align(offset: int) -> int:
+    return -offset % ALIGNMENT
+
+
+def _write_sections(
+        f: BinaryIO,
+        state: Dict[str, Any],
+        layers: Dict[str, np.ndarray],
+        compression: str,
+        packed: Optional[Dict[str, bytes]],
+) -> int:
+    """Write the header, sections and index to `f`, which must be at its
+    start, and return the number of bytes written."""
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression {compression!r}.")
+
+    def pack(data: bytes) -> bytes:
+        return zlib.compress(data, 1) if compression == "zlib" else data
+
+    sections: Dict[str, Dict[str, Any]] = {}
+    blobs: List[Tuple[str, bytes]] = [(
+        "state",
+        pack(json.dumps(state, separators=(",", ":")).encode("utf-8")),
+    )]
+    for name, array in layers.items():
+        blobs.append((name, pack(np.asfortranarray(array).tobytes(order="F"))))
+        sections[name] = {
+            "dtype": np.lib.format.dtype_to_descr(array.dtype),
+            "shape": array.shape,
+        }
+    # Packed sections are already compressed, they are written as is.
+    for name, blob in (packed or {}).items():
+        blobs.append((name, blob))
+        sections[name] = {"packed": True}
+
+    f.write(b"\0" * HEADER.size)
+    for name, blob in blobs:
+        f.write(b"\0" * _align(f.tell()))
+        sections.setdefault(name, {}).update(offset=f.tell(), length=len(blob))
+        f.write(blob)
+
+    index = json.dumps(
+            {"compression": compression, "sections": sections}
+    ).encode("utf-8")
+    index_offset = f.tell()
+    f.write(index)
+    size = f.tell()
+    f.seek(0)
+    f.write(HEADER.pack(MAGIC, VERSION, 0, index_offset, len(index)))
+    return size
+
+
+def _read_sections(f: BinaryIO, filename: Optional[str] = None) -> SaveData:
+    """Read a file written by `_write_sections`.
+
+    If `filename` is the name of the open file `f`, uncompressed layers are
+    memory mapped from it instead of read.
+    """
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+        raise SaveFormatError("This is not a save file.")
+    _, version, _, index_offset, index_length = HEADER.unpack(header)
+    if version > VERSION:
+        raise SaveFormatError(
+                f"Save version {version} is newer than this game "
+                f"supports ({VERSION}).")
+    f.seek(index_offset)
+    index = json.loads(f.read(index_length))
+    compressed = index["compression"] == "zlib"
+    sections = index["sections"]
+
+    def read_section(name: str) -> bytes:
+        f.seek(sections[name]["offset"])
+        data = f.read(sections[name]["length"])
+        return zlib.decompress(data) if compressed else data
+
+    state = json.loads(read_section("state"))
+
+    layers = {}
+    packed = {}
+    for name, section in sections.items():
+        if section.get("packed"):
+            f.seek(section["offset"])
+            packed[name] = f.read(section["length"])
+        if "dtype" not in section:
+            continue
+        dtype = np.lib.format.descr_to_dtype(section["dtype"])
+        shape = tuple(section["shape"])
+        if compressed or filename is None:
+            layers[name] = np.frombuffer(
+                    bytearray(read_section(name)), dtype=dtype,
+            ).reshape(shape, order="F")
+        else:
+            # Map the layer straight from the file. Copy-on-write, so
+            # changes during play never touch the file.
+            layers[name] = np.memmap(
+                    filename, dtype=dtype, mode="c",
+                    offset=section["offset"], shape=shape, order="F",
+            )
+    return state, layers, packed
+
+
+def write_save(
+        filename: str,
+        state: Dict[str, Any],
+        layers: Dict[str, np.ndarray],
+        compression: str = "zlib",
+        packed: Optional[Dict[str, bytes]] = None,
+) -> int:
+    """Write a save file and return its size in bytes.
+
+    The file is written next to `filename` and then moved over it, so an
+    interrupted save never leaves a damaged file behind.
+    """
+    temp_filename = f"{filename}.tmp"
+    with open(temp_filename, "wb") as f:
+        size = _write_sections(f, state, layers, compression, packed)
+    os.replace(temp_filename, filename)
+    return size
+
+
+def read_save(filename: str) -> SaveData:
+    """Read the state, map layers and packed floors of a save file."""
+    with open(filename, "rb") as f:
+        return _read_sections(f, filename)
+
+
+def pack_game_map(game_map: GameMap) -> bytes:
+    """Return a map and its entities as compressed bytes in the save
+    format, for keeping floors the player is not on."""
+    record, layers = encode_game_map(game_map)
+    f = io.BytesIO()
+    _write_sections(f, record, layers, "zlib", None)
+    return f.getvalue()
+
+
+def unpack_game_map(engine: Engine, data: bytes) -> GameMap:
+    """Restore a map packed with `pack_game_map`."""
+    record, layers, _ = _read_sections(io.BytesIO(data))
+    entities = [decode_entity(entity) for entity in record["entities"]]
+    return decode_game_map(engine, record, layers, entities)
+
+
+def save_engine(
+        engine: Engine, filename: str, compression: str = "zlib"
+) -> int:
+    """Save an engine to a file and return the file size in bytes."""
+    state, layers, packed = encode_engine(engine)
+    return write_save(filename, state, layers, compression, packed)
+
+
+def load_engine(filename: str) -> Engine:
+    """Load an engine from a save file."""
+    return decode_engine(*read_save(filename))
@@ -1,11 +1,9 @@
 """Handle the loadnig and initialization of game sessions."""
 from __future__ import annotations
 
-import copy
-import lzma
-import pickle
+import random
 import traceback
-from typing import Optional
+from typing import Any, Dict, Optional, TYPE_CHECKING
 
 import tcod
 
@@ -14,33 +12,46 @@ from engine import Engine
 import entity_factories
 from game_map import GameWorld
 import input_handlers
+import savefile
+
+if TYPE_CHECKING:
+    from floor_pack import FloorPack
 
 
 # Load the background image and remove the alpha channel
 background_image = tcod.image.load("menu_background.png")[:, :, :3]
 
+# The GameWorld settings of new games, also used to make floor packs.
+WORLD_SETTINGS: Dict[str, Any] = {
+    "map_width": 60,
+    "map_height": 40,
+    "room_max_size": 10,
+    "room_min_size": 6,
+    "max_rooms": 30,
+    # The generator of each zone by its first floor: Maintenance,
+    # Residential and Administrative.
+    "zone_generators": {1: "rooms", 3: "bsp", 5: "caves"},
+}
+
 
-def new_game() -> Engine:
-    """Return a brand new game session as an Engine instance."""
-    map_width = 60
-    map_height = 40
+def new_game(
+        seed: Optional[int] = None, floor_pack: Optional[FloorPack] = None
+) -> Engine:
+    """Return a brand new game session as an Engine instance.
 
-    room_max_size = 10
-    room_min_size = 6
-    max_rooms = 30
+    Games started with the same `seed` play out identically. A random seed
+    is used if none is given, one of the runs in `floor_pack` if there is
+    a floor pack.
+    """
+    if seed is None and floor_pack is not None and floor_pack.seeds:
+        seed = random.choice(floor_pack.seeds)
 
-    player = copy.deepcopy(entity_factories.player)
+    player = entity_factories.player.clone()
 
-    engine = Engine(player=player)
+    engine = Engine(player=player, seed=seed)
 
     engine.game_world = GameWorld(
-            engine=engine,
-            max_rooms=max_rooms,
-            room_min_size=room_min_size,
-            room_max_size=room_max_size,
-            map_width=map_width,
-            map_height=map_height,
-    )
+            engine=engine, floor_pack=floor_pack, **WORLD_SETTINGS)
     engine.game_world.generate_floor()
     engine.update_fov()
 
@@ -49,8 +60,8 @@ def new_game() -> Engine:
             color.welcome_text
     )
 
-    armored_plating = copy.deepcopy(entity_factories.armored_plating)
-    thrusters = copy.deepcopy(entity_factories.thrusters)
+    armored_plating = entity_factories.armored_plating.clone()
+    thrusters = entity_factories.thrusters.clone()
 
     armored_plating.parent = player.inventory
     thrusters.parent = player.inventory
@@ -66,14 +77,19 @@ def new_game() -> Engine:
 
 def load_game(filename: str) -> Engine:
     """Load an Engine instance from a file."""
-    with open(filename, "rb") as f:
-        engine = pickle.loads(lzma.decompress(f.read()))
-    assert isinstance(engine, Engine)
+    engine = savefile.load_engine(filename)
+    engine.game_world.prefetch_next_floor()
     return engine
 
 
 class MainMenu(input_handlers.BaseEventHandler):
-    """Handle the main menu rendering and input."""
+    """Handle the main menu rendering and input.
+
+    New games take their floors from `floor_pack` when one is given.
+    """
+
+    def __init__(self, floor_pack: Optional[FloorPack] = None):
+        self.floor_pack = floor_pack
 
     def on_render(self, console: tcod.Console) -> None:
         """Render the main menu on a background image."""
@@ -124,6 +140,7 @@ class MainMenu(input_handlers.BaseEventHandler):
                 return input_handlers.PopupMessage(
                         self, f"Failed to load save: \n{exc}")
         elif event.sym == tcod.event.KeySym.N:
-            return input_handlers.MainGameEventHandler(new_game())
+            return input_handlers.MainGameEventHandler(
+                    new_game(floor_pack=self.floor_pack))
 
         return None
@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import List, Tuple
 
 import numpy as np  # type: ignore
 
@@ -22,19 +22,44 @@ tile_dt = np.dtype(
 )
 
 
+# SHROUD represents unexplored unseen tiles
+SHROUD = np.array((ord("+"), (10, 10, 10), (0, 0, 0)), dtype=graphic_dt)
+
+# Maps store a uint8 tile id per cell. The properties of every tile type are
+# kept here, indexed by tile id, and looked up with `TILES[ids]`.
+MAX_TILE_TYPES = 256
+_tile_types: List[np.ndarray] = []
+TILES = np.zeros(0, dtype=tile_dt)
+# The graphics of every tile id when lit, then every tile id when dark,
+# then SHROUD. See palette_index().
+PALETTE = np.array([SHROUD], dtype=graphic_dt)
+
+
 def new_tile(
         *,  # Enforce the use of keywords, so that parameter order doesn't matter.
         walkable: int,
         transparent: int,
         dark: Tuple[int, Tuple[int, int, int], Tuple[int, int, int]],
         light: Tuple[int, Tuple[int, int, int], Tuple[int, int, int]],
-) -> np.ndarray:
-    """Helper function for defining individual tile types """
-    return np.array((walkable, transparent, dark, light), dtype=tile_dt)
+) -> int:
+    """Register a new tile type and return its tile id."""
+    global TILES, PALETTE
+    if len(_tile_types) == MAX_TILE_TYPES:
+        raise ValueError(f"There can be at most {MAX_TILE_TYPES} tile types.")
+    _tile_types.append(
+        np.array((walkable, transparent, dark, light), dtype=tile_dt))
+    TILES = np.array(_tile_types, dtype=tile_dt)
+    PALETTE = np.concatenate([TILES["light"], TILES["dark"], [SHROUD]])
+    return len(_tile_types) - 1
 
 
-# SHROUD represents unexplored unseen tiles
-SHROUD = np.array((ord("+"), (10, 10, 10), (0, 0, 0)), dtype=graphic_dt)
+def palette_index(
+        tiles: np.ndarray, visible: np.ndarray, explored: np.ndarray
+) -> np.ndarray:
+    """Return the index into PALETTE of the graphics of each tile."""
+    count = len(TILES)
+    ids = tiles.astype(np.int16)
+    return np.where(visible, ids, np.where(explored, ids + count, 2 * count))
 
 
 floor = new_tile(
@@ -55,3 +80,9 @@ down_stairs = new_tile(
     dark=(ord(">"), (100, 100, 100), (0, 0, 0)),
     light=(ord(">"), (0, 0, 255), (0, 0, 0)),
 )
+up_stairs = new_tile(
+    walkable=True,
+    transparent=True,
+    dark=(ord("<"), (100, 100, 100), (0, 0, 0)),
+    light=(ord("<"), (0, 0, 255), (0, 0, 0)),
+)